@@ -50,15 +50,67 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 AUTH_USER_MODEL = 'service.CustomUser'
 
 MIDDLEWARE = [
+    'service.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'service.querybudget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'service.profiling.RequestProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-view query limits checked by QueryBudgetMiddleware; ACTION 'raise'
+# turns an overrun into a 500, 'log' only warns. VIEWS overrides per view name.
+QUERY_BUDGET = {
+    'ENABLED': DEBUG,
+    'ACTION': 'log',
+    'MAX_QUERIES': 20,
+    'MAX_DUPLICATES': 3,
+    'MAX_SQL_TIME': 0.25,
+    'VIEWS': {},
+}
+
+# Rendered service cards and dashboard rows, keyed on version stamps (see
+# service/fragments.py), so TIMEOUT only bounds memory, not staleness.
+FRAGMENT_CACHE = {
+    'TIMEOUT': 3600,
+}
+
+# Anonymous home and catalog pages (service/pagecache.py): fresh for TIMEOUT
+# seconds or until a catalog change, then served stale for up to STALE more
+# seconds while one request re-renders them.
+PAGE_CACHE = {
+    'ENABLED': True,
+    'TIMEOUT': 60,
+    'STALE': 600,
+}
+
+# /metrics in the Prometheus text format. Under gunicorn or Celery prefork set
+# METRICS_DIR to a directory shared by all processes (cleared on deploy);
+# without it each process only reports its own requests and tasks. Scrapers
+# send "Authorization: Bearer <TOKEN>"; with no TOKEN only staff users (or
+# anyone under DEBUG) can read it.
+METRICS = {
+    'DIR': os.environ.get('METRICS_DIR'),
+    'FLUSH_INTERVAL': 1.0,
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+}
+
+# Profiles RATE of all requests, plus staff requests carrying ?profile=1, and
+# lists them in the admin. MODE 'cprofile' stores pstats, 'sampling' samples
+# the stack every INTERVAL seconds into flamegraph-ready collapsed stacks.
+REQUEST_PROFILER = {
+    'ENABLED': os.environ.get('REQUEST_PROFILER') == '1',
+    'MODE': 'cprofile',
+    'RATE': 0.0,
+    'INTERVAL': 0.005,
+    'MIN_DURATION': 0.0,
+    'KEEP': 500,
+}
+
 ROOT_URLCONF = 'ServiceConnect.urls'
 
 TEMPLATES = [
@@ -129,6 +181,24 @@ STATICFILES_DIRS = [
 ]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# collectstatic writes content-hashed copies, a manifest and .gz/.br siblings.
+# Under DEBUG the unhashed app files are served, so no collectstatic is needed.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+                    else 'service.storage.CompressedManifestStaticFilesStorage'},
+}
+# How service.delivery sends static and media files: 'direct' streams them
+# from the worker; behind nginx use 'x-accel' with internal locations such as
+#   location /_protected/media/ { internal; alias <MEDIA_ROOT>/; }
+#   location /_protected/static/ { internal; alias <STATIC_ROOT>/; gzip_static on; }
+# or 'x-sendfile' behind Apache/lighttpd.
+DELIVERY = {
+    'BACKEND': os.environ.get('DELIVERY_BACKEND', 'direct'),
+    'MEDIA_MAX_AGE': 86400,
+    'STATIC_MAX_AGE': 3600,
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -142,6 +212,11 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS =True
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
+EMAIL_TIMEOUT = 30
+
+# Failed messages of a mail batch are retried up to MAX_RETRIES times,
+# waiting RETRY_BACKOFF * 2**attempt seconds.
+EMAIL_BATCH = {'MAX_RETRIES': 4, 'RETRY_BACKOFF': 30}
 
 
 MESSAGE_TAGS = {
@@ -152,9 +227,62 @@ MESSAGE_TAGS = {
     messages.ERROR: 'alert-danger',
 }
 
+# Keep per-company status counters in StatusCounter so the company dashboard
+# reads them directly. Run `manage.py rebuild_status_counters` after enabling.
+SERVICE_STATUS_COUNTERS = True
+
+# Shared cache for counters and fragments. Point CACHE_URL at Redis in
+# production; the per-process locmem fallback only suits a single process.
+if os.environ.get('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Cached unread badge counts live forever in a shared cache; with locmem the
+# web process cannot see increments made by Celery workers, so expire them.
+NOTIFICATION_UNREAD_TTL = None if os.environ.get('CACHE_URL') else 30
+
+# Notifications and emails are written to the outbox with the change that
+# caused them; relay_outbox publishes up to BATCH_SIZE rows per pass, one
+# Celery task per CHUNK_SIZES[task] payloads (default 100).
+OUTBOX = {
+    'BATCH_SIZE': 500,
+    'POLL_INTERVAL': 0.5,
+    'CHUNK_SIZES': {'service.tasks.send_bulk_email': 50, 'service.tasks.generate_image_variants': 5,
+                    'service.tasks.render_invoices': 50,
+                    'service.tasks.import_technicians': 1},
+}
+
 CELERY_BROKER_URL = 'redis://127.0.0.1:6379/0'
 CELERY_RESULT_BACKEND = 'redis://127.0.0.1:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = 'Asia/Kolkata'
\ No newline at end of file
+CELERY_TIMEZONE = 'Asia/Kolkata'
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-unread-notification-counters': {
+        'task': 'service.tasks.reconcile_unread_counters',
+        'schedule': 300.0,
+    },
+}
+
+# Live notifications (Server-Sent Events at /notifications/stream/, ASGI only).
+# Redis pub/sub reaches browsers from Celery workers too; use
+# 'service.push.InProcessBroker' for a single process without Redis.
+NOTIFICATION_PUSH = {
+    'BACKEND': 'service.push.RedisBroker',
+    'OPTIONS': {'url': 'redis://127.0.0.1:6379/0'},
+}
+NOTIFICATION_STREAM_HEARTBEAT = 15
+NOTIFICATION_STREAM_MAX_AGE = 300
+# Upper bound for /notifications/?since=<id>&wait=<seconds> long-polls (ASGI only).
+NOTIFICATION_LONG_POLL_MAX = 25
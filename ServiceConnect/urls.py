@@ -15,14 +15,16 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path,include
+from django.urls import path,include,re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from service import delivery
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('',include('service.urls')),
+    re_path(r'^%s/(?P<path>.+)$' % settings.MEDIA_URL.strip('/'), delivery.media_file),
 ]
 
-if settings.DEBUG:
-    urlpatterns +=static(settings.MEDIA_URL,document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+if not settings.DEBUG:
+    # Under DEBUG, runserver's staticfiles handler serves the app directories.
+    urlpatterns += [re_path(r'^%s/(?P<path>.+)$' % settings.STATIC_URL.strip('/'), delivery.static_file)]
\ No newline at end of file
@@ -1,6 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, CustomerProfile, CompanyProfile, TechnicianProfile, ServiceType, ServiceRequest,Notification
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .models import CustomUser, CustomerProfile, CompanyProfile, TechnicianProfile, ServiceType, ServiceRequest,Notification,StatusCounter,Outbox,RequestProfile,Invoice
+from .profiling import summary
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'role', 'is_active')
@@ -13,4 +18,79 @@ admin.site.register(CompanyProfile)
 admin.site.register(TechnicianProfile)
 admin.site.register(ServiceType)
 admin.site.register(ServiceRequest)
-admin.site.register(Notification)
\ No newline at end of file
+admin.site.register(Notification)
+admin.site.register(StatusCounter)
+
+class OutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'created_at')
+    list_filter = ('task',)
+
+admin.site.register(Outbox, OutboxAdmin)
+
+
+class InvoiceAdmin(admin.ModelAdmin):
+    list_display = ('number', 'service_request', 'total', 'issued_at', 'rendered_at')
+    search_fields = ('number',)
+    readonly_fields = ('service_request', 'number', 'total', 'html_sha256', 'pdf_sha256', 'issued_at', 'rendered_at')
+
+
+admin.site.register(Invoice, InvoiceAdmin)
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'view_name', 'method', 'status_code', 'mode',
+                    'duration_ms', 'sql_ms', 'sql_count', 'template_ms')
+    list_filter = ('view_name', 'mode', 'status_code')
+    search_fields = ('view_name', 'path')
+    exclude = ('stats', 'stacks')
+    readonly_fields = ('view_name', 'path', 'method', 'status_code', 'mode', 'duration_ms', 'sql_ms',
+                       'sql_count', 'template_ms', 'created_at', 'downloads', 'top')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Total ms', ordering='duration')
+    def duration_ms(self, obj):
+        return round(obj.duration * 1000, 1)
+
+    @admin.display(description='SQL ms', ordering='sql_time')
+    def sql_ms(self, obj):
+        return round(obj.sql_time * 1000, 1)
+
+    @admin.display(description='Template ms', ordering='template_time')
+    def template_ms(self, obj):
+        return round(obj.template_time * 1000, 1)
+
+    @admin.display(description='Download')
+    def downloads(self, obj):
+        if obj.stats:
+            return format_html('<a href="{}">pstats</a>',
+                               reverse('admin:service_requestprofile_download', args=[obj.pk, 'pstats']))
+        return format_html('<a href="{}">collapsed stacks</a>',
+                           reverse('admin:service_requestprofile_download', args=[obj.pk, 'collapsed']))
+
+    @admin.display(description='Top')
+    def top(self, obj):
+        return format_html('<pre style="font-size: 11px">{}</pre>', summary(obj))
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/<str:kind>/', self.admin_site.admin_view(self.download),
+                 name='service_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download(self, request, pk, kind):
+        record = get_object_or_404(RequestProfile, pk=pk)
+        if kind == 'pstats' and record.stats:
+            response = HttpResponse(bytes(record.stats), content_type='application/octet-stream')
+            extension = 'pstats'
+        else:
+            response = HttpResponse(record.stacks, content_type='text/plain')
+            extension = 'collapsed'
+        response['Content-Disposition'] = f'attachment; filename="profile-{record.pk}.{extension}"'
+        return response
+
+admin.site.register(RequestProfile, RequestProfileAdmin)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'service'
+
+    def ready(self):
+        from . import metrics, signals  # noqa: F401
+        metrics.connect_celery()
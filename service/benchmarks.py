@@ -0,0 +1,41 @@
+# url name -> (who is logged in, max queries of a GET). QueryCeilingTests holds
+# every URL to its ceiling; bench_views logs in as the same role.
+URL_CEILINGS = {
+    'home': (None, 0),
+    'login': (None, 0),
+    'logout': ('customer', 4),
+    'profile_edit': ('technician', 8),
+    'add_customer': (None, 0),
+    'customer_dashboard': ('customer', 6),
+    'cust_view_services': ('customer', 5),
+    'request_service': ('customer', 6),
+    'my_requests': ('customer', 5),
+    'invoice': ('customer', 9),
+    'payment_proceed': ('customer', 15),  # + invoice job
+    'feedback_view': ('customer', 5),
+    'add_company': (None, 0),
+    'company_dashboard': ('company', 5),
+    'export_requests': ('company', 3),
+    'service_view': ('company', 5),
+    'add_service': ('company', 4),
+    'edit_service': ('company', 4),
+    'delete_service': ('company', 4),
+    'technician_list': ('company', 7),
+    'add_technician': ('company', 4),
+    'bulk_import': ('company', 4),
+    'technician_edit': ('company', 3),
+    'technician_delete': ('company', 3),
+    'assign_technician': ('company', 8),
+    'dispatch_requests': ('company', 2),
+    'mark_payment_pending': ('company', 5),
+    'notifications': ('customer', 5),
+    'notification_stream': ('customer', 2),
+    'mark_notifications_read': ('customer', 2),
+    'metrics': (None, 0),
+    'technician_dashboard': ('technician', 6),
+    'update_request_status': ('technician', 17),
+    'complete_service': ('technician', 6),
+}
+
+# url name -> who is logged in while it is requested
+ROLES = {name: who for name, (who, _) in URL_CEILINGS.items()}
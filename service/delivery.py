@@ -0,0 +1,103 @@
+import mimetypes
+import os
+import posixpath
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+DEFAULTS = {
+    'BACKEND': 'direct',   # 'x-accel' (nginx) or 'x-sendfile' (Apache, lighttpd) hands the bytes off
+    # nginx ``internal`` locations aliasing STATIC_ROOT and MEDIA_ROOT, for 'x-accel'
+    'ACCEL_PREFIXES': {'static': '/_protected/static/', 'media': '/_protected/media/'},
+    'MEDIA_MAX_AGE': 86400,
+    'STATIC_MAX_AGE': 3600,  # files without a content hash in their name
+}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'DELIVERY', {})}
+
+
+def _normalize(path):
+    return posixpath.normpath(path).lstrip('/')
+
+
+def _resolve(root, path):
+    path = _normalize(path)
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:  # escapes the root
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    return path, full_path
+
+
+def _accepted(request):
+    return {part.split(';')[0].strip() for part in request.headers.get('Accept-Encoding', '').split(',')}
+
+
+def send_file(request, kind, root, path, immutable, compressed=False):
+    """Respond with ``root/path``, or hand it to the front server when ``BACKEND`` says so.
+
+    With ``compressed``, a precompressed ``.br``/``.gz`` sibling is sent to
+    clients accepting it (nginx picks those itself with ``gzip_static``).
+    """
+    options = config()
+    path, full_path = _resolve(root, path)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    stat = os.stat(full_path)
+
+    response = get_conditional_response(request, last_modified=int(stat.st_mtime))
+    if response is None:
+        encoding, sent_path = None, full_path
+        if compressed and options['BACKEND'] != 'x-accel':
+            accepted = _accepted(request)
+            for name, suffix in ENCODINGS:
+                if name in accepted and os.path.isfile(full_path + suffix):
+                    encoding, sent_path = name, full_path + suffix
+                    break
+
+        if options['BACKEND'] == 'x-accel':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = quote(options['ACCEL_PREFIXES'][kind] + path)
+        elif options['BACKEND'] == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = sent_path
+        else:
+            response = FileResponse(open(sent_path, 'rb'), content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(stat.st_mtime)
+
+    if compressed:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    if immutable:
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=options[f'{kind.upper()}_MAX_AGE'])
+    return response
+
+
+def static_file(request, path):
+    """``collectstatic`` output; names with a content hash never change, so they are immutable."""
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', None) or {}
+    return send_file(request, 'static', settings.STATIC_ROOT, path,
+                     immutable=path in hashed_files.values(), compressed=True)
+
+
+def media_file(request, path):
+    """Uploads. Image variants carry a content hash in their name (``service.images``)."""
+    path = _normalize(path)  # so ``./invoices/...`` or ``x/../invoices/...`` can't dodge the check
+    if path == 'invoices' or path.startswith('invoices/'):
+        raise Http404  # served by the invoice view, which checks permissions
+    return send_file(request, 'media', settings.MEDIA_ROOT, path,
+                     immutable=path.startswith('derivatives/'))
@@ -0,0 +1,155 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .lifecycle import transition
+from .mailer import queue_email
+from .models import ServiceRequest, TechnicianProfile
+from .notify import notify
+from .workload import load_workloads
+
+DEFAULT_WEIGHTS = {
+    'available': 2.0,      # technician currently marked available
+    'load': 1.0,           # per active job already on the schedule
+    'conflict': 4.0,       # already busy on the preferred date
+    'rating': 3.0,         # scaled by average rating / 5
+    'specialist': 0.5,     # scaled by 1 / number of skills
+}
+UNRATED = 3.0
+
+
+def weights():
+    return {**DEFAULT_WEIGHTS, **getattr(settings, 'DISPATCH_WEIGHTS', {})}
+
+
+def load_skills(technician_ids):
+    """``{technician_id: {service_type_id, ...}}`` from one through-table query."""
+    skills = defaultdict(set)
+    through = TechnicianProfile.service_types.through
+    for tech_id, service_id in through.objects.filter(
+        technicianprofile_id__in=list(technician_ids)
+    ).values_list('technicianprofile_id', 'servicetype_id'):
+        skills[tech_id].add(service_id)
+    return skills
+
+
+def score(workload, skills, service_request, w):
+    tech = workload['tech']
+    conflict = service_request.preferred_date in workload['busy_dates']
+    rating = tech.avg_rating or UNRATED
+    return (
+        w['available'] * (tech.status == 'available')
+        - w['load'] * workload['active_count']
+        - w['conflict'] * conflict
+        + w['rating'] * rating / 5
+        + w['specialist'] / max(len(skills), 1)
+    ), conflict
+
+
+def rank(service_request, workloads, skills, w=None):
+    """Score every skilled workload for ``service_request``, best first."""
+    w = w or weights()
+    ranked = []
+    for workload in workloads:
+        tech_skills = skills.get(workload['tech'].pk, ())
+        if service_request.service_type_id not in tech_skills:
+            continue
+        value, conflict = score(workload, tech_skills, service_request, w)
+        ranked.append({**workload, 'score': round(value, 2), 'conflict': conflict})
+    ranked.sort(key=lambda item: (-item['score'], item['tech'].pk))
+    return ranked
+
+
+def rank_technicians(service_request):
+    """Ranked shortlist of the request company's technicians for ``service_request``."""
+    technicians = list(TechnicianProfile.objects.filter(
+        company_id=service_request.company_id, service_types=service_request.service_type_id))
+    skills = load_skills(tech.pk for tech in technicians)
+    return rank(service_request, load_workloads(technicians), skills)
+
+
+def notify_assignment(service_request, technician):
+    message = f"New {service_request.service_type.name} service request assigned to you for {service_request.customer.cust_name}."
+    notify([technician.user_id], message)
+    queue_email(
+        subject="Technician Assigned",
+        message=f"""
+            Hello {service_request.customer.cust_name},
+
+            Your service request '{service_request.service_type.name}'
+            has been assigned to technician {technician.name}.
+
+            Company: {service_request.company.company_name}
+            """,
+            email=service_request.customer.user.email
+        )
+
+
+def assign(service_request, technician):
+    """Assign ``technician``; returns ``False`` if the request moved on meanwhile."""
+    with transaction.atomic():
+        if not transition(service_request, 'assigned', technician=technician):
+            return False
+        notify_assignment(service_request, technician)
+    return True
+
+
+def auto_assign(service_request):
+    """Assign the best-ranked technician; returns it, or ``None`` if none could be assigned."""
+    ranked = rank_technicians(service_request)
+    if not ranked:
+        return None
+    technician = ranked[0]['tech']
+    if not assign(service_request, technician):
+        return None
+    return technician
+
+
+def dispatch_backlog(company=None, dry_run=False):
+    """Assign every ``requested`` request in one pass; returns ``(request, technician)`` pairs.
+
+    Technicians, skills and schedules are loaded once for the whole backlog
+    and each assignment is folded back into the in-memory workloads, so later
+    requests see the load added by earlier ones.
+    """
+    backlog = ServiceRequest.objects.filter(status='requested').select_related(
+        'customer__user', 'service_type', 'company').order_by('preferred_date', 'created_at', 'id')
+    technicians = TechnicianProfile.objects.all()
+    if company is not None:
+        backlog = backlog.filter(company=company)
+        technicians = technicians.filter(company=company)
+    backlog = list(backlog)
+    if not backlog:
+        return []
+
+    technicians = list(technicians.filter(company_id__in={r.company_id for r in backlog}))
+    skills = load_skills(tech.pk for tech in technicians)
+    by_company = defaultdict(list)
+    for workload in load_workloads(technicians):
+        by_company[workload['tech'].company_id].append(workload)
+
+    w = weights()
+    plan = []
+    for service_request in backlog:
+        ranked = rank(service_request, by_company[service_request.company_id], skills, w)
+        if not ranked:
+            continue
+        best = next(item for item in by_company[service_request.company_id]
+                    if item['tech'].pk == ranked[0]['tech'].pk)
+        best['active_count'] += 1
+        if service_request.preferred_date:
+            best['busy_dates'].add(service_request.preferred_date)
+        plan.append((service_request, best['tech']))
+
+    if dry_run:
+        return plan
+
+    assigned = []
+    with transaction.atomic():
+        for service_request, technician in plan:
+            # Skips requests someone else assigned while we were planning.
+            if transition(service_request, 'assigned', technician=technician):
+                notify_assignment(service_request, technician)
+                assigned.append((service_request, technician))
+    return assigned
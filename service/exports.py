@@ -0,0 +1,94 @@
+import csv
+import json
+from datetime import date
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import ServiceRequest
+
+# column -> lookup
+COLUMNS = {
+    'id': 'id',
+    'created_at': 'created_at',
+    'preferred_date': 'preferred_date',
+    'status': 'status',
+    'service': 'service_type__name',
+    'customer': 'customer__cust_name',
+    'customer_phone': 'customer__phone',
+    'customer_address': 'customer__address',
+    'technician': 'technician__name',
+    'base_price': 'base_price',
+    'extra_charges': 'extra_charges',
+    'actual_price': 'actual_price',
+    'rating': 'rating',
+    'feedback': 'feedback',
+    'updated_at': 'updated_at',
+}
+CHUNK_SIZE = 2000
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+STATUSES = {key for key, _ in ServiceRequest.STATUS_CHOICES}
+
+
+def parse_filters(status=None, start=None, end=None):
+    """Validated filters from user input; raises ``ValueError`` on a bad status or date."""
+    if status and status not in STATUSES:
+        raise ValueError(f"Unknown status {status!r}")
+    return {
+        'status': status or None,
+        'start': date.fromisoformat(start) if start else None,
+        'end': date.fromisoformat(end) if end else None,
+    }
+
+
+def company_requests(company, status=None, start=None, end=None):
+    """The company's requests in dashboard order, so the same indexes answer it."""
+    requests = ServiceRequest.objects.filter(company=company)
+    if status:
+        requests = requests.filter(status=status)
+    if start:
+        requests = requests.filter(preferred_date__gte=start)
+    if end:
+        requests = requests.filter(preferred_date__lte=end)
+    return requests.order_by('-preferred_date', 'id')
+
+
+def rows(queryset, chunk_size=CHUNK_SIZE):
+    """Tuples of ``COLUMNS``, fetched ``chunk_size`` at a time with no model instances."""
+    return queryset.values_list(*COLUMNS.values()).iterator(chunk_size=chunk_size)
+
+
+class _Line:
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(rows):
+    names = list(COLUMNS)
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def stream(queryset, fmt, chunk_size=CHUNK_SIZE):
+    """Encoded output in blocks of about ``chunk_size`` rows.
+
+    Memory use depends on ``chunk_size``, not on how many requests match. The
+    CSV header goes out before the query runs, so clients see bytes at once.
+    """
+    lines = (csv_lines if fmt == 'csv' else jsonl_lines)(rows(queryset, chunk_size))
+    if fmt == 'csv':
+        yield next(lines).encode()
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= chunk_size:
+            yield ''.join(block).encode()
+            block = []
+    if block:
+        yield ''.join(block).encode()
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+
+from . import metrics, push
+from .models import Notification
+
+
+def feed_state(user_id):
+    """Latest notification id and latest unread id for ``user_id`` (one query)."""
+    return Notification.objects.filter(user_id=user_id).aggregate(
+        latest=Max('id'), latest_unread=Max('id', filter=Q(is_read=False)))
+
+
+def etag(state):
+    # Changes whenever a notification arrives or the unread ones are marked read.
+    return f'"{state["latest"] or 0}.{state["latest_unread"] or 0}"'
+
+
+def unread_since(user_id, since=None):
+    notifications = Notification.objects.filter(user_id=user_id, is_read=False)
+    if since is not None:
+        notifications = notifications.filter(id__gt=since)
+    return [push.serialize(n) for n in notifications.order_by('-created_at', '-id')]
+
+
+def _unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def _unread_ttl():
+    return getattr(settings, 'NOTIFICATION_UNREAD_TTL', None)
+
+
+def unread_count(user_id):
+    """Unread badge count, served from the cache; counted once on a miss."""
+    count = cache.get(_unread_key(user_id))
+    metrics.cache_lookup('unread_count', count is not None)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.add(_unread_key(user_id), count, _unread_ttl())
+    return count
+
+
+def incr_unread(user_id, amount=1):
+    try:
+        cache.incr(_unread_key(user_id), amount)
+    except ValueError:
+        pass  # not cached yet; the next read counts from the database
+
+
+def reset_unread(user_id):
+    cache.set(_unread_key(user_id), 0, _unread_ttl())
+
+
+def reconcile_unread(since, batch_size=500):
+    """Recount unread notifications of users who received one after ``since``."""
+    user_ids = list(Notification.objects.filter(created_at__gte=since)
+                    .values_list('user_id', flat=True).distinct().order_by())
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        counts = dict(Notification.objects.filter(user_id__in=batch, is_read=False)
+                      .values_list('user_id').annotate(n=Count('id')).order_by())
+        cache.set_many({_unread_key(uid): counts.get(uid, 0) for uid in batch}, _unread_ttl())
+    return len(user_ids)
+
+
+def parse_since(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Version scopes: 'catalog' covers service cards and modals, 'requests' the
+# company dashboard's request rows. A scope's version changes whenever data
+# shown in its fragments changes without touching the fragment's own row.
+GENERATION_KEY = 'fragments:generation'
+
+
+def config():
+    return {'TIMEOUT': 3600, **getattr(settings, 'FRAGMENT_CACHE', {})}
+
+
+def _key(scope, company_id):
+    return f'fragments:{scope}:{company_id}'
+
+
+def _fresh():
+    # An evicted version restarts from the clock, which is always ahead of the
+    # old value, so it can never collide with fragments cached under it.
+    return time.time_ns()
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _fresh(), None)
+
+
+def bump(scope, company_ids):
+    # After commit, or a concurrent render could cache the old data under the new version.
+    keys = {_key(scope, company_id) for company_id in company_ids if company_id is not None}
+
+    def apply():
+        for key in keys:
+            _bump(key)
+    transaction.on_commit(apply)
+
+
+def invalidate_all():
+    """For bulk rewrites (``bulk_update``, raw SQL) that bypass the signals."""
+    transaction.on_commit(lambda: _bump(GENERATION_KEY))
+
+
+def versions(scope, company_ids):
+    """``{company_id: version}`` for ``scope``, in one cache round trip."""
+    keys = {_key(scope, company_id): company_id for company_id in set(company_ids)}
+    found = cache.get_many([GENERATION_KEY, *keys])
+    missing = {key: _fresh() for key in [GENERATION_KEY, *keys] if key not in found}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, None)
+        found.update(cache.get_many(list(missing)))
+    generation = found.get(GENERATION_KEY, 0)
+    return {company_id: f'{generation}.{found.get(key, 0)}' for key, company_id in keys.items()}
+
+
+def stamp(objects, scope):
+    """Set ``fragment_version`` on each object: its company's version plus ``updated_at``."""
+    objects = list(objects)
+    company_versions = versions(scope, [obj.company_id for obj in objects])
+    for obj in objects:
+        obj.fragment_version = f'{company_versions[obj.company_id]}.{obj.updated_at.timestamp()}'
+    return objects
@@ -0,0 +1,113 @@
+import hashlib
+import io
+import logging
+import os
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import outbox, pagecache
+
+logger = logging.getLogger(__name__)
+
+# model label -> (image field, field holding its variants)
+FIELDS = {
+    'service.ServiceType': ('image', 'image_variants'),
+    'service.CompanyProfile': ('logo', 'logo_variants'),
+}
+# Bounding boxes; images are never upscaled.
+SIZES = {'thumb': (160, 160), 'card': (480, 480), 'modal': (1200, 1200)}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpg': ('JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+TASK = 'service.tasks.generate_image_variants'
+
+
+def variant_name(source, size, ext, data):
+    # The content hash makes every name immutable, so it can be cached forever.
+    root, _ = os.path.splitext(source)
+    return f'derivatives/{root}/{size}.{hashlib.sha256(data).hexdigest()[:12]}.{ext}'
+
+
+def current_variants(field_file, variants):
+    """``variants['sizes']`` if they were made from the file now in the field, else ``None``."""
+    if field_file and variants and variants.get('source') == field_file.name:
+        return variants['sizes']
+    return None
+
+
+def needs_variants(instance):
+    image_field, variants_field = FIELDS[instance._meta.label]
+    field_file = getattr(instance, image_field)
+    return bool(field_file) and current_variants(field_file, getattr(instance, variants_field)) is None
+
+
+def schedule(*instances):
+    """Queue variant generation for ``instances`` through the outbox, in the caller's transaction."""
+    outbox.enqueue(TASK, [[instance._meta.label, instance.pk] for instance in instances])
+
+
+def _flatten(image):
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def render_variants(field_file):
+    """Write every size and format of ``field_file`` to its storage; returns the variants."""
+    storage = field_file.storage
+    with field_file.open('rb') as fh, Image.open(fh) as original:
+        original = ImageOps.exif_transpose(original)
+        has_alpha = 'A' in original.getbands() or 'transparency' in original.info
+        base = original.convert('RGBA' if has_alpha else 'RGB')
+
+    sizes = {}
+    for size, box in SIZES.items():
+        image = base.copy()
+        image.thumbnail(box, Image.Resampling.LANCZOS)
+        entry = {'width': image.width, 'height': image.height}
+        for ext, (image_format, options) in FORMATS.items():
+            frame = _flatten(image) if image_format == 'JPEG' and image.mode == 'RGBA' else image
+            buffer = io.BytesIO()
+            frame.save(buffer, image_format, **options)
+            name = variant_name(field_file.name, size, ext, buffer.getvalue())
+            entry[ext] = name if storage.exists(name) else storage.save(name, ContentFile(buffer.getvalue()))
+        sizes[size] = entry
+    return {'source': field_file.name, 'sizes': sizes}
+
+
+def generate(label, pk, force=False):
+    """Make the variants of one object's image; returns whether any were written."""
+    model = apps.get_model(label)
+    image_field, variants_field = FIELDS[label]
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not getattr(instance, image_field):
+        return False
+    field_file = getattr(instance, image_field)
+    old = getattr(instance, variants_field)
+    if not force and current_variants(field_file, old) is not None:
+        return False
+    try:
+        variants = render_variants(field_file)
+    except (OSError, UnidentifiedImageError):
+        logger.warning("Could not make variants of %s %s (%s)", label, pk, field_file.name, exc_info=True)
+        return False
+
+    updates = {variants_field: variants}
+    if any(field.name == 'updated_at' for field in model._meta.fields):
+        updates['updated_at'] = timezone.now()  # new fragment cache key for its card
+    # .update() skips the post_save handlers, which would queue this task again.
+    # It only applies if the image was not replaced while we were working.
+    if not model.objects.filter(pk=pk, **{image_field: field_file.name}).update(**updates):
+        return False
+    pagecache.invalidate('catalog')
+
+    kept = {entry[ext] for entry in variants['sizes'].values() for ext in FORMATS}
+    for entry in (old or {}).get('sizes', {}).values():
+        for ext in FORMATS:
+            if entry[ext] not in kept:
+                field_file.storage.delete(entry[ext])
+    return True
@@ -0,0 +1,136 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import delivery, outbox
+from .models import Invoice, ServiceRequest
+
+TASK = 'service.tasks.render_invoices'
+
+
+def schedule(request_ids):
+    """Queue rendering through the outbox, in the caller's transaction."""
+    outbox.enqueue(TASK, [[pk] for pk in request_ids])
+
+
+def invoice_number(service_request):
+    return f'INV-{service_request.pk:08d}'
+
+
+def total(service_request):
+    return service_request.actual_price or service_request.base_price + (service_request.extra_charges or 0)
+
+
+def store(content, ext):
+    """Save ``content`` under its SHA-256 unless it is already there; returns the digest."""
+    digest = hashlib.sha256(content).hexdigest()
+    name = f'invoices/{digest[:2]}/{digest}.{ext}'
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(content))
+    return digest
+
+
+def _pdf_text(text):
+    text = str(text).replace('₹', 'Rs. ')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def render_pdf(lines):
+    """A one-page PDF of ``(font_size, text)`` lines in Helvetica.
+
+    Invoices are a few lines of text, which the PDF format can express
+    directly; this avoids a rendering dependency and renders in microseconds.
+    """
+    content = ['BT', '16 TL', '56 780 Td']
+    for size, text in lines:
+        content.append(f'/F1 {size} Tf ({_pdf_text(text)}) Tj T*')
+    content.append('ET')
+    stream = '\n'.join(content).encode('cp1252', 'replace')
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+        b'/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream),
+    ]
+    pdf = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+def pdf_lines(context):
+    sr, customer, company = context['service_request'], context['customer'], context['company']
+    return [
+        (20, f"Invoice {context['number']}"),
+        (10, f"Issued {context['issued_at']:%d %b %Y}"),
+        (10, ''),
+        (12, company.company_name),
+        (10, company.address),
+        (10, f'Phone {company.phone}'),
+        (10, ''),
+        (12, f'Bill to: {customer.cust_name}'),
+        (10, f'{customer.user.email}  {customer.phone}'),
+        (10, ''),
+        (10, f'Service: {sr.service_type.name}'),
+        (10, f"Service date: {sr.preferred_date or '-'}"),
+        (10, f"Technician: {sr.technician.name if sr.technician else '-'}"),
+        (10, ''),
+        (10, f'Base price: Rs. {sr.base_price}'),
+        (10, f'Extra charges: Rs. {sr.extra_charges or 0}'),
+        (14, f"Total paid: Rs. {context['total']}"),
+    ]
+
+
+def render_invoices(request_ids, force=False):
+    """Render and store the invoices of the paid requests among ``request_ids``.
+
+    Existing invoices are kept unless ``force``; their number and issue date
+    never change. Each call loads, renders and saves its whole batch with a
+    handful of queries. Returns how many invoices were (re)rendered.
+    """
+    requests = (ServiceRequest.objects.filter(pk__in=request_ids, status='paid')
+                .select_related('customer__user', 'company', 'technician', 'service_type'))
+    existing = {invoice.service_request_id: invoice
+                for invoice in Invoice.objects.filter(service_request_id__in=request_ids)}
+    now = timezone.now()
+    created, updated = [], []
+    for sr in requests:
+        invoice = existing.get(sr.pk)
+        if invoice is not None and not force:
+            continue
+        if invoice is None:
+            invoice = Invoice(service_request=sr, number=invoice_number(sr), issued_at=sr.updated_at)
+        context = {'service_request': sr, 'customer': sr.customer, 'company': sr.company,
+                   'technician': sr.technician, 'number': invoice.number, 'issued_at': invoice.issued_at,
+                   'total': total(sr)}
+        invoice.total = context['total']
+        invoice.html_sha256 = store(render_to_string('invoice_document.html', context).encode(), 'html')
+        invoice.pdf_sha256 = store(render_pdf(pdf_lines(context)), 'pdf')
+        invoice.rendered_at = now
+        (updated if invoice.pk else created).append(invoice)
+    with transaction.atomic():
+        Invoice.objects.bulk_create(created, ignore_conflicts=True)
+        Invoice.objects.bulk_update(updated, ['total', 'html_sha256', 'pdf_sha256', 'rendered_at'])
+    return len(created) + len(updated)
+
+
+def serve(request, invoice, ext):
+    """The stored document; only ever reached through the permission-checked invoice view."""
+    response = delivery.send_file(request, 'media', settings.MEDIA_ROOT, invoice.path(ext), immutable=False)
+    response['Cache-Control'] = 'private, no-cache'
+    if ext == 'pdf':
+        response['Content-Disposition'] = f'attachment; filename="{invoice.number}.pdf"'
+    return response
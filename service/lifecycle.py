@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import invoices, rollups
+from .models import ServiceRequest
+
+# Target status -> statuses a request may enter it from.
+TRANSITIONS = {
+    'requested': ('assigned', 'accepted', 'rejected', 'Proceeding'),  # technician removed
+    'assigned': ('requested', 'assigned', 'rejected'),
+    'accepted': ('assigned',),
+    'rejected': ('assigned',),
+    'Proceeding': ('accepted',),
+    'completed': ('Proceeding',),
+    'payment_pending': ('Proceeding', 'completed'),
+    'paid': ('payment_pending',),
+    'cancelled': ('requested', 'assigned', 'accepted', 'rejected'),
+}
+CHUNK_SIZE = 500
+
+
+def can_transition(current, status):
+    return current in TRANSITIONS.get(status, ())
+
+
+def transition(service_request, status, **fields):
+    """Move ``service_request`` to ``status`` with one conditional UPDATE.
+
+    Writes only ``status``, ``updated_at`` and ``fields``, and only while the
+    row still holds the status the instance was loaded with, which must be an
+    allowed source. Pinning the exact old status, rather than any allowed one,
+    keeps the status counters exact. Returns whether this call won; the
+    instance is updated in place when it did.
+    """
+    current = service_request.status
+    if not can_transition(current, status):
+        return False
+    values = {**fields, 'status': status, 'updated_at': timezone.now()}
+    with transaction.atomic():
+        won = ServiceRequest.objects.filter(pk=service_request.pk, status=current).update(**values)
+        if won:
+            rollups.record_transition(service_request.company_id, current, status)
+            if status == 'paid':
+                invoices.schedule([service_request.pk])
+    if not won:
+        return False
+    for name, value in values.items():
+        setattr(service_request, name, value)
+    service_request._loaded_status = status
+    return True
+
+
+def transition_many(queryset, status, **fields):
+    """Move every request in ``queryset`` allowed to enter ``status``; returns how many moved.
+
+    Issues one conditional UPDATE per (company, current status) group, so
+    rows changed concurrently are skipped and counters get exact deltas.
+    """
+    groups = defaultdict(list)
+    candidates = queryset.filter(status__in=TRANSITIONS.get(status, ())).order_by()
+    for pk, company_id, current in candidates.values_list('pk', 'company_id', 'status'):
+        groups[(company_id, current)].append(pk)
+
+    values = {**fields, 'status': status, 'updated_at': timezone.now()}
+    moved = 0
+    with transaction.atomic():
+        for (company_id, current), ids in groups.items():
+            for start in range(0, len(ids), CHUNK_SIZE):
+                won = ServiceRequest.objects.filter(
+                    pk__in=ids[start:start + CHUNK_SIZE], status=current).update(**values)
+                rollups.record_transition(company_id, current, status, amount=won)
+                moved += won
+            if status == 'paid':
+                invoices.schedule(ids)  # rows that lost the race are skipped by the task
+    return moved
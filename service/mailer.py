@@ -0,0 +1,52 @@
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from . import outbox
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, message, email):
+    """Record one email; the outbox relay sends them in batches over a shared SMTP session."""
+    queue_emails([[subject, message, email]])
+
+
+def queue_emails(messages):
+    """Record ``[subject, message, email]`` triples with one insert."""
+    outbox.enqueue('service.tasks.send_bulk_email', messages)
+
+
+def deliver(messages, connection=None):
+    """Send ``[subject, body, recipient]`` triples over one SMTP session.
+
+    Returns the triples that failed. A failed message only costs itself: the
+    session is reopened and the rest of the batch carries on.
+    """
+    connection = connection or get_connection(fail_silently=False)
+    messages = [list(message) for message in messages]
+    try:
+        connection.open()
+    except Exception:
+        logger.warning("Could not open mail connection", exc_info=True)
+        return messages
+    failed = []
+    try:
+        for position, (subject, body, recipient) in enumerate(messages):
+            email = EmailMessage(subject, body, settings.EMAIL_HOST_USER, [recipient],
+                                 connection=connection)
+            try:
+                email.send()
+            except Exception:
+                logger.warning("Could not send email to %s", recipient, exc_info=True)
+                failed.append([subject, body, recipient])
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    failed.extend(messages[position + 1:])
+                    break
+    finally:
+        connection.close()
+    return failed
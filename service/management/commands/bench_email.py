@@ -0,0 +1,100 @@
+import socketserver
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection, send_mail
+from django.core.management.base import BaseCommand
+
+from service.mailer import deliver
+
+
+class SMTPSink(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept and discard mail."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        time.sleep(self.server.connect_delay)  # stands in for TCP + TLS setup
+        self.reply('220 localhost sink')
+        in_data = False
+        for line in self.rfile:
+            if in_data:
+                if line == b'.\r\n':
+                    in_data = False
+                    self.server.received += 1
+                    self.reply('250 queued')
+                continue
+            command = line[:4].upper()
+            if command == b'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif command == b'DATA':
+                in_data = True
+                self.reply('354 go ahead')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                break
+            else:
+                self.reply('250 ok')
+
+
+class Sink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay):
+        super().__init__(('127.0.0.1', 0), SMTPSink)
+        self.connect_delay = connect_delay
+        self.received = 0
+
+
+class Command(BaseCommand):
+    help = "Compare one-connection-per-email delivery against pooled batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--backend', choices=['smtp', 'locmem'], default='smtp',
+                            help="smtp runs a local sink server; locmem measures overhead only.")
+        parser.add_argument('--connect-delay', type=float, default=0.02,
+                            help="Seconds the sink waits before greeting, to mimic a TLS handshake.")
+
+    def handle(self, *args, **options):
+        count, size = options['count'], options['batch_size']
+        messages = [[f"Benchmark {i}", "Hello from the mail benchmark.", f"user{i}@example.com"]
+                    for i in range(count)]
+
+        sink = None
+        if options['backend'] == 'smtp':
+            sink = Sink(options['connect_delay'])
+            threading.Thread(target=sink.serve_forever, daemon=True).start()
+            connect = lambda: get_connection(
+                'django.core.mail.backends.smtp.EmailBackend', host='127.0.0.1',
+                port=sink.server_address[1], username='', password='',
+                use_tls=False, use_ssl=False, fail_silently=False)
+        else:
+            connect = lambda: get_connection('django.core.mail.backends.locmem.EmailBackend')
+
+        try:
+            start = time.perf_counter()
+            for subject, body, recipient in messages:
+                send_mail(subject, body, settings.EMAIL_HOST_USER, [recipient], connection=connect())
+            single = time.perf_counter() - start
+
+            start = time.perf_counter()
+            failed = 0
+            for i in range(0, count, size):
+                failed += len(deliver(messages[i:i + size], connection=connect()))
+            pooled = time.perf_counter() - start
+        finally:
+            if sink is not None:
+                sink.shutdown()
+                sink.server_close()
+
+        self.stdout.write(f"one-at-a-time: {count / single:8.1f} msg/s ({single:.2f}s)")
+        self.stdout.write(f"pooled x{size:<5}: {count / pooled:8.1f} msg/s ({pooled:.2f}s)")
+        if sink is not None:
+            self.stdout.write(f"sink received {sink.received} messages, {failed} failed")
+        self.stdout.write(self.style.SUCCESS(f"Speed-up: {single / pooled:.1f}x"))
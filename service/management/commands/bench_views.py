@@ -0,0 +1,183 @@
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from service.benchmarks import ROLES
+from service.models import CompanyProfile, ServiceRequest
+from service.querybudget import QueryRecorder
+from service.urls import urlpatterns
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Command(BaseCommand):
+    help = "Benchmark every URL in service/urls.py through the test client and store the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--company', type=int, help="Company whose data the URLs use (default: that of the newest request).")
+        parser.add_argument('--only', nargs='*', help="Benchmark only these url names.")
+        parser.add_argument('--host', default='localhost', help="Host header; must be in ALLOWED_HOSTS.")
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', help="Earlier results file; regressions make the command fail.")
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help="Allowed p50 slowdown in percent when comparing.")
+        parser.add_argument('--min-delta', type=float, default=1.0,
+                            help="Ignore p50 slowdowns smaller than this many milliseconds.")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError("--iterations must be at least 2.")
+        missing = {pattern.name for pattern in urlpatterns} - set(ROLES)
+        if missing:
+            raise CommandError(f"No role configured for: {', '.join(sorted(missing))}")
+
+        fixtures = self.fixtures(options['company'])
+        client = Client(HTTP_HOST=options['host'], raise_request_exception=False)
+        results = {}
+        for pattern in urlpatterns:
+            if options['only'] and pattern.name not in options['only']:
+                continue
+            url = reverse(pattern.name, kwargs=self.url_kwargs(pattern, fixtures))
+            user = fixtures['users'][ROLES[pattern.name]] if ROLES[pattern.name] else None
+            results[pattern.name] = self.measure(client, url, user, options['iterations'], options['warmup'])
+            self.report(pattern.name, results[pattern.name])
+
+        output = {
+            'commit': git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'vendor': connection.vendor,
+            'iterations': options['iterations'],
+            'company': fixtures['company'].pk,
+            'results': results,
+        }
+        with open(options['output'], 'w') as fh:
+            json.dump(output, fh, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+        if options['compare']:
+            self.compare(options['compare'], results, options['threshold'], options['min_delta'])
+
+    def fixtures(self, company_id):
+        if company_id is None:
+            company_id = ServiceRequest.objects.order_by('-pk').values_list('company_id', flat=True).first()
+        company = CompanyProfile.objects.filter(pk=company_id).first()
+        if company is None:
+            raise CommandError("No company to benchmark with; run seed_data first.")
+        requests = {}
+        for status, _ in ServiceRequest.STATUS_CHOICES:
+            requests[status] = ServiceRequest.objects.filter(
+                company=company, status=status).select_related('customer__user', 'technician__user').first()
+        by_customer = requests['payment_pending'] or requests['paid'] or requests['requested']
+        by_technician = requests['assigned'] or requests['accepted'] or requests['Proceeding']
+        if by_customer is None or by_technician is None or by_technician.technician is None:
+            raise CommandError(f"Company {company.pk} lacks requests in the statuses the URLs need.")
+        return {
+            'company': company,
+            'service': company.services.order_by('pk').first(),
+            'technician': by_technician.technician,
+            'requests': requests,
+            'users': {'company': company.user, 'customer': by_customer.customer.user,
+                      'technician': by_technician.technician.user},
+            'customer_request': by_customer,
+            'technician_request': by_technician,
+        }
+
+    def url_kwargs(self, pattern, fixtures):
+        requests = fixtures['requests']
+        values = {
+            'id': fixtures['company'].pk, 'service_id': fixtures['service'].pk,
+            'pk': fixtures['service'].pk, 'tech_id': fixtures['technician'].pk,
+            'request_id': fixtures['customer_request'].pk, 'status': 'accepted',
+        }
+        if pattern.name == 'mark_payment_pending':
+            values['pk'] = (requests['completed'] or fixtures['customer_request']).pk
+        if pattern.name in ('update_request_status', 'complete_service'):
+            values['request_id'] = fixtures['technician_request'].pk
+        return {name: values[name] for name in pattern.pattern.converters}
+
+    def request(self, client, url, user, trace=False):
+        """One GET, rolled back afterwards so state-changing URLs can be repeated.
+
+        Returns ``(status, seconds, recorder, peak_bytes)``; the allocation peak
+        is only traced with ``trace``, which slows the request down.
+        """
+        if user is not None:
+            client.force_login(user)
+        recorder, peak = QueryRecorder(), None
+        with transaction.atomic():
+            if trace:
+                tracemalloc.start()
+            try:
+                with recorder.record():
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    elapsed = time.perf_counter() - start
+                if trace:
+                    peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                if trace:
+                    tracemalloc.stop()
+            transaction.set_rollback(True)
+        return response.status_code, elapsed, recorder, peak
+
+    def measure(self, client, url, user, iterations, warmup):
+        for _ in range(warmup):
+            self.request(client, url, user)
+        timings, queries, sql = [], [], []
+        for _ in range(iterations):
+            status, elapsed, recorder, _ = self.request(client, url, user)
+            timings.append(elapsed)
+            queries.append(recorder.count)
+            sql.append(recorder.duration)
+
+        *_, peak = self.request(client, url, user, trace=True)
+
+        return {
+            'url': url,
+            'status': status,
+            'p50_ms': round(statistics.median(timings) * 1000, 2),
+            'p95_ms': round(statistics.quantiles(timings, n=20)[18] * 1000, 2),
+            'mean_ms': round(statistics.fmean(timings) * 1000, 2),
+            'queries': max(queries),
+            'sql_ms': round(statistics.median(sql) * 1000, 2),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:26} {result['status']:>3} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+            f"{result['queries']:3} queries  {result['sql_ms']:7.2f}ms SQL  {result['peak_kb']:9.1f}KB peak")
+
+    def compare(self, path, results, threshold, min_delta):
+        with open(path) as fh:
+            baseline = json.load(fh)
+        regressions = []
+        for name, result in results.items():
+            before = baseline['results'].get(name)
+            if before is None:
+                continue
+            slower = result['p50_ms'] - before['p50_ms']
+            if slower > min_delta and result['p50_ms'] > before['p50_ms'] * (1 + threshold / 100):
+                regressions.append(f"{name}: p50 {before['p50_ms']}ms -> {result['p50_ms']}ms")
+            if result['queries'] > before['queries']:
+                regressions.append(f"{name}: {before['queries']} -> {result['queries']} queries")
+        if regressions:
+            raise CommandError(f"Regressions against {baseline['commit']}:\n" + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {baseline['commit']}."))
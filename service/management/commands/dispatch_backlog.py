@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from service.dispatch import dispatch_backlog
+from service.models import CompanyProfile
+
+
+class Command(BaseCommand):
+    help = "Auto-assign every 'requested' service request to the best-scoring technician."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Only dispatch this company id.")
+        parser.add_argument('--dry-run', action='store_true', help="Print the plan without assigning.")
+
+    def handle(self, *args, **options):
+        company = None
+        if options['company']:
+            try:
+                company = CompanyProfile.objects.get(pk=options['company'])
+            except CompanyProfile.DoesNotExist:
+                raise CommandError(f"Company {options['company']} does not exist.")
+
+        plan = dispatch_backlog(company, dry_run=options['dry_run'])
+        for service_request, technician in plan:
+            self.stdout.write(f"#{service_request.pk} -> {technician.name}")
+        verb = "Planned" if options['dry_run'] else "Assigned"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(plan)} requests."))
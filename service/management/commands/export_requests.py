@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from service import exports
+from service.models import CompanyProfile
+
+
+class Command(BaseCommand):
+    help = "Stream a company's service requests as CSV or JSON lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('company', type=int, help="CompanyProfile id.")
+        parser.add_argument('--format', choices=exports.FORMATS, default='csv')
+        parser.add_argument('--status', help="Only requests in this status.")
+        parser.add_argument('--from', dest='start', help="First service date (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='end', help="Last service date (YYYY-MM-DD).")
+        parser.add_argument('--output', '-o', help="File to write; default stdout.")
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        company = CompanyProfile.objects.filter(pk=options['company']).first()
+        if company is None:
+            raise CommandError(f"No company with id {options['company']}")
+        try:
+            filters = exports.parse_filters(options['status'], options['start'], options['end'])
+        except ValueError as e:
+            raise CommandError(e)
+        queryset = exports.company_requests(company, **filters)
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for block in exports.stream(queryset, options['format'], options['chunk_size']):
+                out.write(block)
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
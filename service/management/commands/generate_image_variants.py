@@ -0,0 +1,29 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from service import images, outbox
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG variants for existing service images and company logos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=images.FIELDS, action='append',
+                            help="Only this model (repeatable); default all.")
+        parser.add_argument('--force', action='store_true', help="Regenerate variants that are up to date (not with --queue).")
+        parser.add_argument('--queue', action='store_true',
+                            help="Queue the work for the Celery workers via the outbox instead of running it here.")
+
+    def handle(self, *args, **options):
+        for label in options['model'] or images.FIELDS:
+            image_field, _ = images.FIELDS[label]
+            pks = (apps.get_model(label).objects.exclude(**{f'{image_field}__isnull': True})
+                   .exclude(**{image_field: ''}).order_by('pk').values_list('pk', flat=True))
+            if options['queue']:
+                pks = list(pks)
+                outbox.enqueue(images.TASK, [[label, pk] for pk in pks])
+                self.stdout.write(f"{label}: queued {len(pks)}")
+                continue
+            done = sum(images.generate(label, pk, force=options['force']) for pk in pks.iterator())
+            self.stdout.write(f"{label}: generated variants for {done}")
+        self.stdout.write(self.style.SUCCESS("Done."))
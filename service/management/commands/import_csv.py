@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from service import onboarding
+from service.models import CompanyProfile
+
+
+class Command(BaseCommand):
+    help = "Import a company's technicians or services from a CSV file; nothing is imported if any row is invalid."
+
+    def add_arguments(self, parser):
+        parser.add_argument('company', type=int, help="CompanyProfile id.")
+        parser.add_argument('kind', choices=onboarding.COLUMNS)
+        parser.add_argument('path')
+        parser.add_argument('--workers', type=int, help="Password hashing processes; 0 hashes in this process.")
+
+    def handle(self, *args, **options):
+        company = CompanyProfile.objects.filter(pk=options['company']).first()
+        if company is None:
+            raise CommandError(f"No company with id {options['company']}")
+        with open(options['path'], encoding='utf-8') as fh:
+            content = fh.read()
+        try:
+            if options['kind'] == 'technicians':
+                created = onboarding.import_technicians(company, content, workers=options['workers'])
+            else:
+                created = onboarding.import_services(company, content)
+        except onboarding.ImportFailed as e:
+            for line, message in e.errors:
+                self.stderr.write(f"line {line}: {message}")
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(created)} {options['kind']}."))
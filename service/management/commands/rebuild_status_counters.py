@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from service.rollups import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-company ServiceRequest status counters from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, action='append', dest='companies',
+                            help="Only rebuild this company id (repeatable).")
+
+    def handle(self, *args, **options):
+        written = rebuild_counters(options['companies'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} status counters."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from service.ratings import recompute_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute stored rating aggregates for services, companies and technicians."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = recompute_ratings(batch_size=options['batch_size'])
+        for name, count in updated.items():
+            self.stdout.write(f"{name}: {count} rated rows")
+        self.stdout.write(self.style.SUCCESS("Rating aggregates recomputed."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from service import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for the service catalog."
+
+    def handle(self, *args, **options):
+        if not search.supported():
+            self.stdout.write(self.style.WARNING("Database backend has no full-text index; nothing to do."))
+            return
+        search.create_index(connection)
+        indexed = search.reindex_all()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} services."))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from service import outbox
+
+
+class Command(BaseCommand):
+    help = "Publish pending outbox rows to Celery in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the outbox and exit.")
+        parser.add_argument('--batch-size', type=int, help="Rows per pass (default OUTBOX['BATCH_SIZE']).")
+        parser.add_argument('--interval', type=float, help="Idle sleep in seconds (default OUTBOX['POLL_INTERVAL']).")
+
+    def handle(self, *args, **options):
+        config = outbox.config()
+        batch_size = options['batch_size'] or config['BATCH_SIZE']
+        interval = options['interval'] or config['POLL_INTERVAL']
+        total = 0
+        while True:
+            close_old_connections()
+            relayed = outbox.relay(batch_size)
+            total += relayed
+            if relayed < batch_size:
+                if options['once']:
+                    break
+                time.sleep(interval)
+        self.stdout.write(self.style.SUCCESS(f"Relayed {total} outbox rows."))
@@ -0,0 +1,44 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from service import invoices
+from service.models import ServiceRequest
+
+
+def _render(chunk, force):
+    # Runs in a worker process, which opens its own database connection.
+    return invoices.render_invoices(chunk, force=force)
+
+
+class Command(BaseCommand):
+    help = "Render the invoices of paid requests, e.g. to backfill them or after changing the template."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', type=date.fromisoformat, help="First service date (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='end', type=date.fromisoformat, help="Last service date (YYYY-MM-DD).")
+        parser.add_argument('--force', action='store_true', help="Re-render invoices that already exist.")
+        parser.add_argument('--workers', type=int, default=4, help="Worker processes; 0 renders in this process.")
+        parser.add_argument('--chunk-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        requests = ServiceRequest.objects.filter(status='paid')
+        if options['start']:
+            requests = requests.filter(preferred_date__gte=options['start'])
+        if options['end']:
+            requests = requests.filter(preferred_date__lte=options['end'])
+        if not options['force']:
+            requests = requests.filter(invoice__isnull=True)
+        ids = list(requests.order_by('pk').values_list('pk', flat=True))
+        size = options['chunk_size']
+        chunks = [ids[start:start + size] for start in range(0, len(ids), size)]
+
+        if options['workers'] < 1:
+            done = sum(invoices.render_invoices(chunk, force=options['force']) for chunk in chunks)
+        else:
+            connections.close_all()  # forked workers must not share this connection
+            with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+                done = sum(pool.map(_render, chunks, [options['force']] * len(chunks)))
+        self.stdout.write(self.style.SUCCESS(f"Rendered {done} of {len(ids)} invoices."))
@@ -0,0 +1,174 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from service import search
+from service.models import (CompanyProfile, CustomerProfile, Notification, ServiceRequest,
+                            ServiceType, TechnicianProfile)
+from service.ratings import recompute_ratings
+from service.rollups import rebuild_counters
+
+User = get_user_model()
+
+PRESETS = {
+    'small': dict(companies=20, technicians=200, customers=2_000, requests=20_000, notifications=100_000),
+    'medium': dict(companies=1_000, technicians=10_000, customers=100_000, requests=1_000_000,
+                   notifications=5_000_000),
+    'production': dict(companies=10_000, technicians=100_000, customers=1_000_000,
+                       requests=10_000_000, notifications=50_000_000),
+}
+STATUS_WEIGHTS = {
+    'requested': 8, 'assigned': 6, 'accepted': 5, 'rejected': 2, 'Proceeding': 5,
+    'completed': 4, 'payment_pending': 8, 'paid': 55, 'cancelled': 7,
+}
+STATUSES = list(STATUS_WEIGHTS)
+CUM_WEIGHTS = list(accumulate(STATUS_WEIGHTS.values()))
+SERVICE_NAMES = ['AC Repair', 'Plumbing', 'Electrical Wiring', 'Carpentry', 'Painting',
+                 'Pest Control', 'Appliance Repair', 'Deep Cleaning', 'Roofing', 'Gardening']
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic companies, technicians, customers, requests and notifications."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--preset', choices=PRESETS, default='small')
+        for name in PRESETS['small']:
+            parser.add_argument(f'--{name}', type=int, help=f"Override the preset's {name} count.")
+        parser.add_argument('--services-per-company', type=int, default=5)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--password', default='password', help="Password of every generated user.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for reproducible data.")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        counts = {name: options[name] if options[name] is not None else value
+                  for name, value in PRESETS[options['preset']].items()}
+        self.password = make_password(options['password'])
+        # Numbering continues after existing users so usernames and phones stay unique.
+        self.offset = User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+        companies = self.create_companies(counts['companies'])
+        services = self.create_services(companies, options['services_per_company'])
+        technicians = self.create_technicians(companies, services, counts['technicians'])
+        customers = self.create_customers(counts['customers'])
+        self.create_requests(companies, services, technicians, customers, counts['requests'])
+        self.create_notifications(counts['notifications'])
+
+        self.stdout.write("Rebuilding status counters, ratings and the search index...")
+        rebuild_counters()
+        recompute_ratings()
+        for ids in chunked((pk for pks in services.values() for pk in pks), 500):
+            search.index_services(ids)
+        self.stdout.write(self.style.SUCCESS(f"Seeded {counts} (password: {options['password']!r})."))
+
+    def insert(self, label, model, objects, total, returning=True):
+        """``bulk_create`` ``objects`` in chunks, one transaction each; returns the new pks."""
+        start, pks = time.perf_counter(), []
+        for chunk in chunked(objects, self.chunk_size):
+            with transaction.atomic():
+                created = model.objects.bulk_create(chunk)
+            if returning:
+                pks.extend(obj.pk for obj in created)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label}: {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f}/s)")
+        return pks
+
+    def users(self, role, count):
+        return (User(username=f'seed_{role}_{self.offset + i}', email=f'{role}{self.offset + i}@example.com',
+                     password=self.password, role=role) for i in range(count))
+
+    def phone(self, role_digit, i):
+        return f'{role_digit}{(self.offset + i) % 10**9:09d}'
+
+    def create_companies(self, count):
+        user_ids = self.insert('company users', User, self.users('company', count), count)
+        return self.insert('companies', CompanyProfile, (
+            CompanyProfile(user_id=user_id, company_name=f'Company {self.offset + i}',
+                           phone=self.phone(1, i), address=f'{i} Market Road')
+            for i, user_id in enumerate(user_ids)), count)
+
+    def create_services(self, company_ids, per_company):
+        rows = [(company_id, name) for company_id in company_ids
+                for name in self.random.sample(SERVICE_NAMES, min(per_company, len(SERVICE_NAMES)))]
+        pks = self.insert('services', ServiceType, (
+            ServiceType(company_id=company_id, name=name, description=f'Professional {name.lower()}',
+                        base_price=Decimal(self.random.randrange(200, 5000, 50)))
+            for company_id, name in rows), len(rows))
+        services = {}
+        for (company_id, _), pk in zip(rows, pks):
+            services.setdefault(company_id, []).append(pk)
+        return services
+
+    def create_technicians(self, company_ids, services, count):
+        user_ids = self.insert('technician users', User, self.users('technician', count), count)
+        companies = [self.random.choice(company_ids) for _ in range(count)]
+        pks = self.insert('technicians', TechnicianProfile, (
+            TechnicianProfile(user_id=user_id, company_id=company_id, name=f'Technician {self.offset + i}',
+                              phone=self.phone(2, i),
+                              status=self.random.choice(('available', 'available', 'busy')))
+            for i, (user_id, company_id) in enumerate(zip(user_ids, companies))), count)
+
+        through = TechnicianProfile.service_types.through
+        skills = [through(technicianprofile_id=pk, servicetype_id=service_id)
+                  for pk, company_id in zip(pks, companies)
+                  for service_id in self.random.sample(services[company_id],
+                                                       self.random.randint(1, min(3, len(services[company_id]))))]
+        self.insert('technician skills', through, skills, len(skills), returning=False)
+        technicians = {}
+        for pk, company_id in zip(pks, companies):
+            technicians.setdefault(company_id, []).append(pk)
+        return technicians
+
+    def create_customers(self, count):
+        user_ids = self.insert('customer users', User, self.users('customer', count), count)
+        return self.insert('customers', CustomerProfile, (
+            CustomerProfile(user_id=user_id, cust_name=f'Customer {self.offset + i}',
+                            phone=self.phone(3, i), address=f'{i} Lake View')
+            for i, user_id in enumerate(user_ids)), count)
+
+    def service_request(self, company_ids, services, technicians, customer_ids, today):
+        company_id = self.random.choice(company_ids)
+        status = self.random.choices(STATUSES, cum_weights=CUM_WEIGHTS)[0]
+        base_price = Decimal(self.random.randrange(200, 5000, 50))
+        extra = Decimal(self.random.choice((0, 0, 0, 100, 250)))
+        done = status in ('completed', 'payment_pending', 'paid')
+        technician_id = None
+        if status not in ('requested', 'cancelled') and technicians.get(company_id):
+            technician_id = self.random.choice(technicians[company_id])
+        rating = self.random.randint(1, 5) if status == 'paid' and self.random.random() < 0.6 else None
+        return ServiceRequest(
+            customer_id=self.random.choice(customer_ids), company_id=company_id,
+            service_type_id=self.random.choice(services[company_id]), technician_id=technician_id,
+            title='Synthetic request', status=status, base_price=base_price,
+            extra_charges=extra if done else 0, actual_price=base_price + extra if done else 0,
+            preferred_date=today + timedelta(days=self.random.randint(-365, 30)),
+            rating=rating, feedback='Great service' if rating else None,
+        )
+
+    def create_requests(self, company_ids, services, technicians, customer_ids, count):
+        today = timezone.localdate()
+        self.insert('service requests', ServiceRequest, (
+            self.service_request(company_ids, services, technicians, customer_ids, today)
+            for _ in range(count)), count, returning=False)
+
+    def create_notifications(self, count):
+        user_ids = list(User.objects.filter(username__startswith='seed_').values_list('pk', flat=True))
+        self.insert('notifications', Notification, (
+            Notification(user_id=self.random.choice(user_ids), message=f'Synthetic notification {i}',
+                         is_read=self.random.random() < 0.8)
+            for i in range(count)), count, returning=False)
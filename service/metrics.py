@@ -0,0 +1,254 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from .querybudget import QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'DIR': None,             # shared directory for multi-process servers and workers
+    'FLUSH_INTERVAL': 1.0,   # seconds between writes of this process's file
+    'TOKEN': None,           # bearer token required by /metrics when set
+}
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'http_requests_total': ('counter', "Requests handled, by view, method and status."),
+    'http_request_duration_seconds': ('histogram', "Request latency by view."),
+    'db_queries_total': ('counter', "Database queries run while handling requests, by view."),
+    'db_query_duration_seconds_total': ('counter', "Time spent in database queries, by view."),
+    'cache_requests_total': ('counter', "Cache lookups by cache use and result (hit or miss)."),
+    'celery_tasks_total': ('counter', "Celery tasks finished, by task and state."),
+    'celery_task_duration_seconds': ('histogram', "Celery task runtime by task."),
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+class Registry:
+    """This process's metric values, periodically written to its own file.
+
+    Every process (web worker, Celery child) owns one file in ``DIR`` and
+    nothing else writes it, so no locking is needed across processes; the
+    exposition sums all files. Files of exited processes are kept so counters
+    never go backwards, as with Prometheus' own multiprocess mode.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        self.histograms = {}
+        self._path = None
+        self._flushed_at = 0.0
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+        self.flush()
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'counts': [0] * (len(BUCKETS) + 1), 'sum': 0.0}
+            histogram['counts'][bisect_left(BUCKETS, value)] += 1
+            histogram['sum'] += value
+        self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), h['counts'], h['sum']]
+                               for (name, labels), h in self.histograms.items()],
+            }
+
+    def path(self, directory):
+        if self._path is None:
+            # pid alone can be reused by a later process and clobber its totals.
+            self._path = os.path.join(directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+        return self._path
+
+    def flush(self, force=False):
+        directory = config()['DIR']
+        now = time.monotonic()
+        if not directory or (not force and now - self._flushed_at < config()['FLUSH_INTERVAL']):
+            return
+        self._flushed_at = now
+        path = self.path(directory)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(f'{path}.tmp', 'w') as fh:
+                json.dump(self.snapshot(), fh)
+            os.replace(f'{path}.tmp', path)
+        except OSError:
+            logger.warning("Could not write metrics to %s", path, exc_info=True)
+
+
+registry = Registry()
+atexit.register(registry.flush, force=True)
+# A forked child (gunicorn --preload, Celery prefork) must not re-count its parent.
+os.register_at_fork(after_in_child=registry.reset)
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, labels, amount)
+
+
+def observe(name, value, **labels):
+    registry.observe(name, labels, value)
+
+
+def cache_lookup(use, hit):
+    inc('cache_requests_total', use=use, result='hit' if hit else 'miss')
+
+
+def _merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, {'counts': [0] * len(counts), 'sum': 0.0})
+            merged['counts'] = [a + b for a, b in zip(merged['counts'], counts)]
+            merged['sum'] += total
+    return counters, histograms
+
+
+def collect():
+    """Merged values of every process: ``(counters, histograms)``."""
+    directory = config()['DIR']
+    if not directory:
+        return _merge([registry.snapshot()])
+    registry.flush(force=True)
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as fh:
+                snapshots.append(json.load(fh))
+        except (OSError, ValueError):
+            continue  # a file being replaced right now; it is counted next scrape
+    return _merge(snapshots)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+            continue
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip([*BUCKETS, '+Inf'], histogram['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(histogram["sum"])}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Request count, latency and database queries per view."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        await sync_to_async(recorder.start)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.stop)()
+        self.record(request, response, time.perf_counter() - start, recorder)
+        return response
+
+    def record(self, request, response, duration, recorder):
+        match = request.resolver_match
+        view = match.view_name if match else '<unmatched>'
+        inc('http_requests_total', view=view, method=request.method, status=response.status_code)
+        observe('http_request_duration_seconds', duration, view=view)
+        if recorder.count:
+            inc('db_queries_total', recorder.count, view=view)
+            inc('db_query_duration_seconds_total', recorder.duration, view=view)
+
+
+_task_starts = {}
+
+
+def task_started(task_id=None, **kwargs):
+    _task_starts[task_id] = time.perf_counter()
+
+
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    start = _task_starts.pop(task_id, None)
+    name = getattr(task, 'name', 'unknown')
+    inc('celery_tasks_total', task=name, state=(state or 'UNKNOWN').lower())
+    if start is not None:
+        observe('celery_task_duration_seconds', time.perf_counter() - start, task=name)
+
+
+def connect_celery():
+    from celery.signals import task_postrun, task_prerun, worker_process_shutdown
+
+    task_prerun.connect(task_started, weak=False)
+    task_postrun.connect(task_finished, weak=False)
+    worker_process_shutdown.connect(lambda **kwargs: registry.flush(force=True), weak=False)
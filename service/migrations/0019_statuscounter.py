@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    ServiceRequest = apps.get_model('service', 'ServiceRequest')
+    StatusCounter = apps.get_model('service', 'StatusCounter')
+    rows = ServiceRequest.objects.values('company_id', 'status').annotate(n=Count('id')).order_by()
+    StatusCounter.objects.bulk_create(
+        [StatusCounter(company_id=r['company_id'], status=r['status'], count=r['n']) for r in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0018_alter_companyprofile_phone_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('requested', 'Requested'), ('assigned', 'Assigned'), ('accepted', 'Accepted'), ('rejected', 'Rejected'), ('Proceeding', 'Proceeding'), ('completed', 'Completed'), ('payment_pending', 'Payment Pending'), ('paid', 'Paid'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_counters', to='service.companyprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'status'), name='unique_company_status_counter')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:25
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_aggregates(apps, schema_editor):
+    ServiceRequest = apps.get_model('service', 'ServiceRequest')
+    rated = ServiceRequest.objects.filter(rating__isnull=False)
+    for model_name, fk in (('ServiceType', 'service_type_id'),
+                           ('CompanyProfile', 'company_id'),
+                           ('TechnicianProfile', 'technician_id')):
+        model = apps.get_model('service', model_name)
+        rows = rated.exclude(**{f'{fk}__isnull': True}).values(fk).annotate(
+            n=Count('id'), total=Sum('rating')).order_by()
+        model.objects.bulk_update(
+            [model(pk=r[fk], rating_count=r['n'], rating_sum=r['total']) for r in rows],
+            ['rating_count', 'rating_sum'], batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0019_statuscounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companyprofile',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='companyprofile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='servicetype',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='servicetype',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='technicianprofile',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='technicianprofile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# Frozen copy of the schema in service/search.py at the time of this
+# migration; later changes to that module must not alter history.
+SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS service_search USING fts5("
+    "name, description, company_name, company_id UNINDEXED, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "INSERT INTO service_search (rowid, name, description, company_name, company_id) "
+    "SELECT s.id, s.name, s.description, c.company_name, s.company_id "
+    "FROM service_servicetype s JOIN service_companyprofile c ON c.id = s.company_id",
+]
+POSTGRES = [
+    "CREATE TABLE IF NOT EXISTS service_search ("
+    "rowid bigint PRIMARY KEY, company_id bigint NOT NULL, document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS service_search_document_idx ON service_search USING GIN (document)",
+    "INSERT INTO service_search (rowid, company_id, document) "
+    "SELECT s.id, s.company_id, "
+    "setweight(to_tsvector('simple', s.name), 'A') || "
+    "setweight(to_tsvector('simple', c.company_name), 'B') || "
+    "setweight(to_tsvector('simple', s.description), 'C') "
+    "FROM service_servicetype s JOIN service_companyprofile c ON c.id = s.company_id "
+    "ON CONFLICT (rowid) DO NOTHING",
+]
+
+
+def create_search_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE, 'postgresql': POSTGRES}.get(schema_editor.connection.vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS service_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0020_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
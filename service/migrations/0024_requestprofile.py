@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0023_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view_name', models.CharField(blank=True, max_length=200)),
+                ('path', models.CharField(max_length=500)),
+                ('method', models.CharField(max_length=10)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('mode', models.CharField(choices=[('cprofile', 'cProfile'), ('sampling', 'Sampling')], max_length=10)),
+                ('duration', models.FloatField()),
+                ('sql_time', models.FloatField()),
+                ('sql_count', models.PositiveIntegerField()),
+                ('template_time', models.FloatField()),
+                ('stats', models.BinaryField(blank=True, null=True)),
+                ('stacks', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
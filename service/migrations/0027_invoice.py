@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0026_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Invoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.CharField(max_length=20, unique=True)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('html_sha256', models.CharField(max_length=64)),
+                ('pdf_sha256', models.CharField(max_length=64)),
+                ('issued_at', models.DateTimeField()),
+                ('rendered_at', models.DateTimeField(auto_now=True)),
+                ('service_request', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='invoice', to='service.servicerequest')),
+            ],
+        ),
+    ]
@@ -8,6 +8,20 @@ phone_validator = RegexValidator(
     message="Enter a valid 10-digit phone number."
 )
 
+class RatingAggregate(models.Model):
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def avg_rating(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
+
 class CustomUser(AbstractUser):
 
     ROLE_CHOICES = (
@@ -31,28 +45,31 @@ class CustomerProfile(models.Model):
         return self.user.username
 
 
-class CompanyProfile(models.Model):
+class CompanyProfile(RatingAggregate):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='company_profile')
     company_name = models.CharField(max_length=100)
     phone = models.CharField(
         validators=[phone_validator], max_length=10, unique=True)
     address = models.TextField()
     logo = models.ImageField(upload_to='company_logo/', blank=True, null=True)
+    logo_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.company_name
     
-class ServiceType(models.Model):
+class ServiceType(RatingAggregate):
     company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE, related_name='services')
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     base_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00) 
     image = models.ImageField(upload_to='service_images/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.company.company_name})"
     
-class TechnicianProfile(models.Model):
+class TechnicianProfile(RatingAggregate):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='technician_profile')
     company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE, related_name='company_technicians')
     name = models.CharField(max_length=100)
@@ -68,6 +85,9 @@ class TechnicianProfile(models.Model):
     def __str__(self):
         return f"{self.user.username} ({self.company.company_name})"
     
+# ServiceRequest statuses that occupy a technician's schedule.
+DUTY_STATUSES = ('assigned', 'accepted', 'Proceeding', 'completed')
+
 class ServiceRequest(models.Model):
     STATUS_CHOICES = (
         ('requested', 'Requested'),
@@ -80,6 +100,7 @@ class ServiceRequest(models.Model):
         ('paid', 'Paid'),
         ('cancelled', 'Cancelled'),
     )
+    DUTY_STATUSES = DUTY_STATUSES
 
     customer = models.ForeignKey(CustomerProfile, on_delete=models.CASCADE, related_name='customer_requests')
     company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE, related_name='company_requests')
@@ -97,14 +118,114 @@ class ServiceRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', '-preferred_date', 'id'], name='sr_company_date_idx'),
+            models.Index(fields=['company', 'status', '-preferred_date', 'id'], name='sr_company_status_date_idx'),
+            models.Index(fields=['technician', 'status', 'preferred_date'], name='sr_tech_status_date_idx'),
+            models.Index(fields=['customer', '-created_at', 'id'], name='sr_customer_created_idx'),
+            models.Index(
+                fields=['technician', 'preferred_date'], name='sr_tech_duty_idx',
+                condition=models.Q(status__in=DUTY_STATUSES),
+            ),
+            models.Index(
+                fields=['company', 'created_at'], name='sr_company_requested_idx',
+                condition=models.Q(status='requested'),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.customer.cust_name} -{self.service_type.name} - {self.company.company_name}"
 
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        # post_init does not run on refresh; the counters in service.signals
+        # must see what the row holds now, not what was loaded first.
+        self._loaded_status = self.__dict__.get('status')
+        self._loaded_rating = self.__dict__.get('rating')
+
 class Notification(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
     message = models.TextField()
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_created_idx'),
+            models.Index(
+                fields=['user', '-created_at'], name='notif_unread_idx',
+                condition=models.Q(is_read=False),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.message[:50]}"
+
+class StatusCounter(models.Model):
+    company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE, related_name='status_counters')
+    status = models.CharField(max_length=20, choices=ServiceRequest.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'status'], name='unique_company_status_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.company.company_name} - {self.status}: {self.count}"
+
+class Outbox(models.Model):
+    """A side effect recorded in the same transaction as the change that caused it.
+
+    ``relay_outbox`` publishes pending rows to Celery in batches and deletes them.
+    """
+    task = models.CharField(max_length=100)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.task} #{self.pk}"
+
+class RequestProfile(models.Model):
+    """A profiled request, recorded by ``RequestProfilerMiddleware``."""
+    MODE_CHOICES = (
+        ('cprofile', 'cProfile'),
+        ('sampling', 'Sampling'),
+    )
+    view_name = models.CharField(max_length=200, blank=True)
+    path = models.CharField(max_length=500)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField()
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    duration = models.FloatField()
+    sql_time = models.FloatField()
+    sql_count = models.PositiveIntegerField()
+    template_time = models.FloatField()
+    stats = models.BinaryField(null=True, blank=True)  # marshalled pstats, as written by dump_stats
+    stacks = models.TextField(blank=True)  # collapsed stacks for flamegraph tools
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.view_name or self.path} ({self.duration * 1000:.0f}ms)"
+
+class Invoice(models.Model):
+    """The rendered, immutable invoice of a paid request.
+
+    The documents live in the default storage under their SHA-256, see
+    ``service.invoices``; re-rendering identical data reuses the same files.
+    """
+    service_request = models.OneToOneField(ServiceRequest, on_delete=models.CASCADE, related_name='invoice')
+    number = models.CharField(max_length=20, unique=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    html_sha256 = models.CharField(max_length=64)
+    pdf_sha256 = models.CharField(max_length=64)
+    issued_at = models.DateTimeField()
+    rendered_at = models.DateTimeField(auto_now=True)
+
+    def path(self, ext):
+        digest = self.pdf_sha256 if ext == 'pdf' else self.html_sha256
+        return f'invoices/{digest[:2]}/{digest}.{ext}'
+
     def __str__(self):
-        return f"{self.user.username} - {self.message[:50]}"
\ No newline at end of file
+        return self.number
@@ -0,0 +1,13 @@
+from . import outbox
+
+TASK = 'service.tasks.create_notifications'
+
+
+def notify(user_ids, message):
+    """Record ``message`` for every user id; the outbox relay bulk-inserts them."""
+    outbox.enqueue(TASK, [[user_id, message] for user_id in user_ids])
+
+
+def notify_each(pairs):
+    """Record different messages for different users: ``[(user_id, message), ...]``."""
+    outbox.enqueue(TASK, [[user_id, message] for user_id, message in pairs])
@@ -0,0 +1,274 @@
+import csv
+import io
+import multiprocessing
+import posixpath
+import random
+import string
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.storage import default_storage
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from . import fragments, images, mailer, outbox, pagecache, search
+from .models import CompanyProfile, ServiceType, TechnicianProfile
+from .notify import notify
+
+User = get_user_model()
+
+# kind -> (required columns, optional columns)
+COLUMNS = {
+    'technicians': (('name', 'email', 'phone'), ('service_types',)),
+    'services': (('name', 'base_price'), ('description', 'image')),
+}
+# Below this many passwords, starting worker processes costs more than it saves.
+POOL_THRESHOLD = 16
+MAX_ROWS = 5000
+TASK = 'service.tasks.import_technicians'
+
+
+class ImportFailed(Exception):
+    """The file was rejected; ``errors`` holds ``(line, message)`` pairs for every problem found."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} problem(s) in the file")
+        self.errors = errors
+
+
+def generate_username(email, company_name):
+    email_prefix = email.split('@')[0]
+    random_number = random.randint(100, 999)
+    return f"{company_name[:3].lower()}_{email_prefix}_{random_number}"
+
+
+def generate_password(length=8):
+    characters = string.ascii_letters + string.digits
+    return ''.join(random.choice(characters) for _ in range(length))
+
+
+def welcome_email(company, name, username, password, email):
+    """``[subject, message, email]`` for a new technician's credentials."""
+    return [f"Welcome to {company.company_name}!", f"""
+                    Dear {name},
+
+                    Welcome to **{company.company_name}**!
+
+                    Your technician account has been successfully created and activated.
+                    You can now log in to your dashboard and begin managing your assigned service requests.
+
+                     **Login Credentials**
+                    • **Username:** {username}
+                    • **Password:** {password}
+
+                    Please keep your credentials confidential and do not share them with anyone.
+
+                    If you have any questions or need assistance, feel free to reach out to your company admin or our support team.
+
+                    Thank you for joining our team!
+                    We look forward to working with you.
+
+                    Warm regards,
+                    {company.company_name}
+                    Support Team
+                    """, email]
+
+
+def hash_passwords(passwords, workers=None):
+    """``make_password`` of each password, spread over worker processes for large batches.
+
+    Each hash deliberately costs a large fraction of a second of CPU, so
+    hundreds of them in one process take minutes; never call this from a
+    request. Workers are spawned rather than forked. Daemonic processes, such
+    as Celery's prefork children, may not start any and hash inline.
+    """
+    if workers == 0 or len(passwords) < POOL_THRESHOLD or multiprocessing.current_process().daemon:
+        return [make_password(password) for password in passwords]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(make_password, passwords, chunksize=8))
+
+
+def read_rows(content, kind):
+    """``(line, row)`` pairs of a CSV file's text; raises ``ImportFailed`` on a bad header."""
+    required, optional = COLUMNS[kind]
+    reader = csv.DictReader(io.StringIO(content.lstrip('\ufeff')))
+    header = {name.strip().lower() for name in reader.fieldnames or ()}
+    missing = [name for name in required if name not in header]
+    unknown = sorted(header - set(required) - set(optional))
+    if missing or unknown:
+        raise ImportFailed([(1, f"Missing columns: {', '.join(missing)}" if missing
+                             else f"Unknown columns: {', '.join(unknown)}")])
+    rows = []
+    for row in reader:
+        row = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+        if any(row.values()):
+            rows.append((reader.line_num, row))
+    if len(rows) > MAX_ROWS:
+        raise ImportFailed([(1, f"At most {MAX_ROWS} rows per file")])
+    return rows
+
+
+def _clean(model, name, value, line, errors):
+    try:
+        return model._meta.get_field(name).clean(value, None)
+    except ValidationError as e:
+        errors.append((line, f"{name}: {' '.join(e.messages)}"))
+
+
+def validate_technicians(company, rows):
+    """Check every row against the file and the database; returns cleaned rows or raises ``ImportFailed``."""
+    services = {name.lower(): pk for name, pk in ServiceType.objects.filter(company=company).values_list('name', 'pk')}
+    taken_phones = set(TechnicianProfile.objects.filter(
+        phone__in=[row['phone'] for _, row in rows]).values_list('phone', flat=True))
+    errors, cleaned, seen_emails, seen_phones = [], [], set(), set()
+    for line, row in rows:
+        count = len(errors)
+        name = _clean(TechnicianProfile, 'name', row['name'], line, errors)
+        phone = _clean(TechnicianProfile, 'phone', row['phone'], line, errors)
+        email = row['email'].lower()
+        try:
+            validate_email(email)
+        except ValidationError:
+            errors.append((line, f"email: {row['email']!r} is not a valid email address"))
+        if phone in taken_phones or phone in seen_phones:
+            errors.append((line, f"phone: {phone} is already used by a technician"))
+        if email in seen_emails:
+            errors.append((line, f"email: {email} appears more than once"))
+        service_ids = []
+        for service in filter(None, (part.strip() for part in row.get('service_types', '').split(';'))):
+            if service.lower() not in services:
+                errors.append((line, f"service_types: {company.company_name} has no service {service!r}"))
+            else:
+                service_ids.append(services[service.lower()])
+        seen_emails.add(email)
+        seen_phones.add(phone)
+        if len(errors) == count:
+            cleaned.append({'name': name, 'email': email, 'phone': phone, 'service_ids': sorted(set(service_ids))})
+    if errors:
+        raise ImportFailed(errors)
+    return cleaned
+
+
+def _image_error(image):
+    """Why ``image`` can't be a service image, or ``None`` if it names an uploaded one."""
+    directory = ServiceType._meta.get_field('image').upload_to.rstrip('/') + '/'
+    if not posixpath.normpath(image).startswith(directory):
+        return f"image: {image!r} is not under {directory}"
+    try:
+        if not default_storage.exists(image):
+            return f"image: no uploaded file {image!r}"
+    except SuspiciousFileOperation:
+        return f"image: {image!r} is not a valid file name"
+
+
+def validate_services(company, rows):
+    """Check every row against the file and the database; returns cleaned rows or raises ``ImportFailed``."""
+    existing = {name.lower() for name in ServiceType.objects.filter(company=company).values_list('name', flat=True)}
+    errors, cleaned, seen = [], [], set()
+    for line, row in rows:
+        count = len(errors)
+        name = _clean(ServiceType, 'name', row['name'], line, errors)
+        base_price = _clean(ServiceType, 'base_price', row['base_price'], line, errors)
+        if base_price is not None and base_price < 0:
+            errors.append((line, "base_price: must not be negative"))
+        if name and (name.lower() in existing or name.lower() in seen):
+            errors.append((line, f"name: {company.company_name} already has a service {name!r}"))
+        image = row.get('image', '')
+        if image and (error := _image_error(image)):
+            errors.append((line, error))
+        seen.add((name or '').lower())
+        if len(errors) == count:
+            cleaned.append({'name': name, 'base_price': base_price,
+                            'description': row.get('description', ''), 'image': image or None})
+    if errors:
+        raise ImportFailed(errors)
+    return cleaned
+
+
+def _usernames(company, emails):
+    """A fresh, unused username per email, checked against the database in one query per round."""
+    usernames = {email: generate_username(email, company.company_name) for email in emails}
+    while True:
+        taken = set(User.objects.filter(username__in=usernames.values()).values_list('username', flat=True))
+        counts = Counter(usernames.values())
+        clashes = [email for email, username in usernames.items() if username in taken or counts[username] > 1]
+        if not clashes:
+            return usernames
+        for email in clashes:
+            usernames[email] = generate_username(email, company.company_name)
+
+
+def create_technicians(company, rows, workers=None):
+    """Create a technician per validated row, or none; returns them.
+
+    Each technician gets a user with a random password, emailed to them.
+    """
+    usernames = _usernames(company, [row['email'] for row in rows])
+    passwords = [generate_password() for _ in rows]
+    hashes = hash_passwords(passwords, workers)
+
+    with transaction.atomic():
+        users = User.objects.bulk_create([
+            User(username=usernames[row['email']], email=row['email'], password=password_hash, role='technician')
+            for row, password_hash in zip(rows, hashes)])
+        technicians = TechnicianProfile.objects.bulk_create([
+            TechnicianProfile(user=user, company=company, name=row['name'], phone=row['phone'])
+            for user, row in zip(users, rows)])
+        Through = TechnicianProfile.service_types.through
+        Through.objects.bulk_create([
+            Through(technicianprofile_id=technician.pk, servicetype_id=service_id)
+            for technician, row in zip(technicians, rows) for service_id in row['service_ids']])
+        mailer.queue_emails([
+            welcome_email(company, row['name'], user.username, password, user.email)
+            for row, user, password in zip(rows, users, passwords)])
+        # bulk_create skips the post_save handlers in service.signals.
+        fragments.bump('requests', [company.pk])
+    return technicians
+
+
+def import_technicians(company, content, workers=None):
+    """Validate and create every technician in the CSV ``content`` right away; for ``import_csv``."""
+    return create_technicians(company, validate_technicians(company, read_rows(content, 'technicians')), workers)
+
+
+def queue_technicians(company, content):
+    """Validate the CSV ``content`` now and leave hashing and inserting to a worker; returns the row count.
+
+    Raises ``ImportFailed`` like ``import_technicians``. The company is
+    notified once the technicians exist, or if the import failed after all.
+    """
+    rows = validate_technicians(company, read_rows(content, 'technicians'))
+    outbox.enqueue(TASK, [[company.pk, rows]])
+    return len(rows)
+
+
+def run_queued(company_id, rows):
+    """The worker side of ``queue_technicians``; returns how many technicians were created."""
+    company = CompanyProfile.objects.filter(pk=company_id).first()
+    if company is None:
+        return 0
+    try:
+        technicians = create_technicians(company, rows)
+    except IntegrityError:
+        # e.g. a phone number was taken after the file was validated
+        notify([company.user_id], "Your technician import failed because the data changed meanwhile; "
+                                  "nothing was imported. Please upload the file again.")
+        return 0
+    notify([company.user_id], f"Imported {len(technicians)} technicians from your CSV file.")
+    return len(technicians)
+
+
+def import_services(company, content):
+    """Create every service in the CSV ``content``, or none; returns them."""
+    rows = validate_services(company, read_rows(content, 'services'))
+    with transaction.atomic():
+        services = ServiceType.objects.bulk_create([ServiceType(company=company, **row) for row in rows])
+        # bulk_create skips the post_save handlers in service.signals.
+        search.index_services([service.pk for service in services])
+        fragments.bump('requests', [company.pk])
+        pagecache.invalidate('catalog')
+        images.schedule(*[service for service in services if images.needs_variants(service)])
+    return services
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Outbox
+
+
+def config():
+    return {'BATCH_SIZE': 500, 'POLL_INTERVAL': 0.5, 'CHUNK_SIZES': {},
+            **getattr(settings, 'OUTBOX', {})}
+
+
+def enqueue(task, payloads):
+    """Record one ``task`` payload per item, in the caller's transaction.
+
+    ``task`` is the dotted path of a Celery task taking a list of payloads.
+    """
+    Outbox.objects.bulk_create([Outbox(task=task, payload=payload) for payload in payloads])
+
+
+def relay(batch_size=None):
+    """Publish the oldest pending rows; returns how many were relayed.
+
+    Payloads for the same task are grouped into chunks of ``CHUNK_SIZES[task]``
+    (default 100) so each Celery message carries a whole batch. Rows are only
+    deleted once every chunk is published: if the broker fails the batch is
+    retried on the next pass, so delivery is at-least-once.
+    """
+    options = config()
+    batch_size = batch_size or options['BATCH_SIZE']
+    with transaction.atomic():
+        rows = list(Outbox.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size])
+        if not rows:
+            return 0
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row.task, []).append(row.payload)
+        for task, payloads in grouped.items():
+            size = options['CHUNK_SIZES'].get(task, 100)
+            publish = import_string(task)
+            for start in range(0, len(payloads), size):
+                publish.delay(payloads[start:start + size])
+        Outbox.objects.filter(pk__in=[row.pk for row in rows]).delete()
+    return len(rows)
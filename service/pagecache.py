@@ -0,0 +1,125 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import metrics
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TIMEOUT': 60,      # seconds an entry is served as fresh
+    'STALE': 600,       # further seconds it may be served while one request re-renders it
+    'LOCK_TIMEOUT': 30,
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'PAGE_CACHE', {})}
+
+
+def _tag_key(tag):
+    return f'pagecache:tag:{tag}'
+
+
+def invalidate(*tags):
+    """Mark every page cached under ``tags`` stale, once the current transaction commits."""
+    def apply():
+        now = time.time()
+        cache.set_many({_tag_key(tag): now for tag in tags}, None)
+    transaction.on_commit(apply)
+
+
+def tag_versions(tags):
+    """Last change time of each tag; an evicted tag counts as changed now."""
+    found = cache.get_many([_tag_key(tag) for tag in tags])
+    missing = {_tag_key(tag): time.time() for tag in tags if _tag_key(tag) not in found}
+    for key, value in missing.items():
+        cache.add(key, value, None)
+    if missing:
+        found.update(cache.get_many(list(missing)))
+    return [found[_tag_key(tag)] for tag in tags]
+
+
+def cacheable(request, params):
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return False
+    if set(request.GET) - set(params):
+        return False  # e.g. tracking parameters, which the page's own links carry along
+    return not len(get_messages(request))
+
+
+def _key(name, request, params):
+    query = urlencode(sorted((param, request.GET[param]) for param in params if request.GET.get(param)))
+    return f'pagecache:{name}:{hashlib.md5(query.encode()).hexdigest()}'
+
+
+def _entry(response, version):
+    return {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+        'version': version,
+        'created': time.time(),
+    }
+
+
+def _respond(request, entry, options):
+    last_modified = int(entry['version'])
+    response = get_conditional_response(request, etag=entry['etag'], last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=options['TIMEOUT'],
+                        stale_while_revalidate=options['STALE'])
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def anonymous_page(tags, params):
+    """Serve anonymous GETs of the view from the cache, keyed on the ``params`` query values.
+
+    ``invalidate(tag)`` marks the pages stale. A stale entry keeps being served
+    while the first request to see it renders the replacement, so a popular
+    page never makes every concurrent visitor hit the database at once.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            options = config()
+            if not options['ENABLED'] or not cacheable(request, params):
+                return view(request, *args, **kwargs)
+
+            name = view.__name__
+            key = _key(name, request, params)
+            version = max(tag_versions(tags))
+            entry = cache.get(key)
+            locked = False
+            if entry is not None:
+                fresh = entry['version'] == version and time.time() - entry['created'] < options['TIMEOUT']
+                locked = not fresh and cache.add(f'{key}:lock', 1, options['LOCK_TIMEOUT'])
+                if not locked:
+                    metrics.cache_lookup(f'page:{name}', True)
+                    return _respond(request, entry, options)
+            metrics.cache_lookup(f'page:{name}', False)
+
+            try:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming or response.cookies:
+                    return response
+                entry = _entry(response, version)
+                cache.set(key, entry, options['TIMEOUT'] + options['STALE'])
+            finally:
+                if locked:
+                    cache.delete(f'{key}:lock')
+            return _respond(request, entry, options)
+        return wrapper
+    return decorator
@@ -0,0 +1,188 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """One page of a :class:`CursorPaginator`, usable like a Django ``Page``."""
+
+    def __init__(self, paginator, object_list, has_next, has_previous, query=None):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.query = query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return self.paginator.encode('n', self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return self.paginator.encode('p', self.object_list[0])
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        query = self.query.copy() if self.query is not None else None
+        if query is None:
+            return f'?{self.paginator.param}={cursor}'
+        query[self.paginator.param] = cursor
+        return f'?{query.urlencode()}'
+
+    @property
+    def next_link(self):
+        return self._link(self.next_cursor)
+
+    @property
+    def previous_link(self):
+        return self._link(self.previous_cursor)
+
+    @cached_property
+    def approximate_count(self):
+        return self.paginator.approximate_count
+
+    @property
+    def count_is_exact(self):
+        return self.approximate_count <= self.paginator.count_limit
+
+
+class CursorPaginator:
+    """Keyset paginator: every page is one indexed range query, no OFFSET.
+
+    ``ordering`` lists the sort keys (``'-preferred_date', 'id'``); the last
+    key must be unique. Nullable keys sort last in both directions of travel.
+    Cursors are opaque url-safe tokens holding the boundary row's key values.
+    """
+
+    def __init__(self, queryset, per_page, ordering, param='cursor', count_limit=1000):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.param = param
+        self.count_limit = count_limit
+        self.keys = []
+        for key in ordering:
+            name = key.lstrip('-')
+            self.keys.append((name, key.startswith('-'), self._field(name)))
+
+    def _field(self, name):
+        try:
+            return self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None  # an annotation, e.g. a search rank
+
+    def _order_by(self, reverse):
+        order = []
+        for name, descending, field in self.keys:
+            nulls = {}
+            if self._nullable(field):
+                nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+            expression = F(name)
+            if descending != reverse:
+                order.append(expression.desc(**nulls))
+            else:
+                order.append(expression.asc(**nulls))
+        return order
+
+    def _nullable(self, field):
+        return field is not None and field.null
+
+    def _beyond(self, name, descending, field, value, forward):
+        """Rows strictly after (``forward``) or before ``value`` on one key."""
+        if value is None:
+            # NULLs sort last: nothing comes after them, every value before.
+            return None if forward else Q(**{f'{name}__isnull': False})
+        lookup = 'lt' if descending == forward else 'gt'
+        condition = Q(**{f'{name}__{lookup}': value})
+        if forward and self._nullable(field):
+            condition |= Q(**{f'{name}__isnull': True})
+        return condition
+
+    def _keyset_filter(self, values, forward):
+        condition = Q(pk__in=[])
+        prefix = Q()
+        for (name, descending, field), value in zip(self.keys, values):
+            beyond = self._beyond(name, descending, field, value, forward)
+            if beyond is not None:
+                condition |= prefix & beyond
+            if value is None:
+                prefix &= Q(**{f'{name}__isnull': True})
+            else:
+                prefix &= Q(**{name: value})
+        return condition
+
+    def encode(self, direction, obj):
+        values = []
+        for name, _, field in self.keys:
+            value = getattr(obj, name)
+            if value is not None and field is not None:
+                value = field.value_to_string(obj)
+            values.append(value)
+        payload = json.dumps([direction, values], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded))
+            if direction not in ('n', 'p') or len(values) != len(self.keys):
+                raise InvalidCursor(cursor)
+            values = [
+                field.to_python(value) if field is not None and value is not None else value
+                for (_, _, field), value in zip(self.keys, values)
+            ]
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+        return direction, values
+
+    def page(self, cursor=None, query=None):
+        direction, values = ('n', None)
+        if cursor:
+            direction, values = self.decode(cursor)
+        forward = direction == 'n'
+
+        queryset = self.queryset.order_by(*self._order_by(reverse=not forward))
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, forward))
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if forward:
+            return CursorPage(self, rows, has_next=more, has_previous=values is not None, query=query)
+        rows.reverse()
+        return CursorPage(self, rows, has_next=True, has_previous=more, query=query)
+
+    def get_page(self, request):
+        """Page for ``request``'s cursor parameter; bad cursors give page one."""
+        try:
+            return self.page(request.GET.get(self.param), query=request.GET)
+        except InvalidCursor:
+            return self.page(query=request.GET)
+
+    @cached_property
+    def approximate_count(self):
+        """Row count capped at ``count_limit + 1`` so it never scans far."""
+        return self.queryset.order_by()[:self.count_limit + 1].count()
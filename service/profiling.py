@@ -0,0 +1,202 @@
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template.base import Template
+
+from .models import RequestProfile
+from .querybudget import QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'MODE': 'cprofile',         # or 'sampling'
+    'RATE': 0.0,                # fraction of all requests to profile
+    'STAFF_PARAM': 'profile',   # ?profile=1 profiles the request of a staff user
+    'INTERVAL': 0.005,          # seconds between stack samples
+    'MIN_DURATION': 0.0,        # don't store faster requests
+    'KEEP': 500,                # newest profiles kept
+}
+# Prune after about one in this many stored profiles; the bound on rows is then KEEP plus a few.
+PRUNE_EVERY = 50
+TEMPLATE_RENDER = Template.render.__code__
+TEMPLATE_FRAME = f'{Template.__module__}.{Template.render.__qualname__}'
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_PROFILER', {})}
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread.
+
+    Cheaper than cProfile on deep call trees and gives flamegraph-ready
+    collapsed stacks (``outer;inner count``) instead of per-function totals.
+    Resolution is bounded by the interpreter's switch interval (5ms by
+    default), so it suits the slow requests worth profiling.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = Counter()
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            names = []
+            while frame is not None:
+                names.append(frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.counts[';'.join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.counts.most_common())
+
+    def template_time(self):
+        samples = sum(count for stack, count in self.counts.items() if TEMPLATE_FRAME in stack)
+        return samples * self.interval
+
+
+def template_time(stats):
+    """Cumulative ``Template.render`` time; cProfile counts only outermost calls."""
+    key = (TEMPLATE_RENDER.co_filename, TEMPLATE_RENDER.co_firstlineno, TEMPLATE_RENDER.co_name)
+    entry = stats.get(key)
+    return entry[3] if entry else 0.0
+
+
+class StatsFile:
+    """Feeds stored ``marshal`` data to ``pstats.Stats``, which loads from profile-like objects."""
+
+    def __init__(self, data):
+        self.stats = marshal.loads(bytes(data))
+
+    def create_stats(self):
+        pass
+
+
+def summary(record, limit=40):
+    """Text overview of a stored profile for the admin."""
+    if record.stats:
+        out = io.StringIO()
+        stats = pstats.Stats(StatsFile(record.stats), stream=out)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+    return '\n'.join(record.stacks.splitlines()[:limit])
+
+
+class RequestProfilerMiddleware:
+    """Profile sampled requests, or a staff user's ``?profile=1`` request, into ``RequestProfile``.
+
+    Disabled, Django drops it from the stack entirely. It is sync-only on
+    purpose: under ASGI Django then runs it and the sync view beneath it in
+    one thread, which is the thread the profilers observe.
+    """
+
+    def __init__(self, get_response):
+        self.options = config()
+        if not self.options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def wanted(self, request):
+        if self.options['RATE'] and random.random() < self.options['RATE']:
+            return True
+        param = self.options['STAFF_PARAM']
+        return bool(param and param in request.GET and request.user.is_staff)
+
+    def __call__(self, request):
+        if not self.wanted(request):
+            return self.get_response(request)
+
+        mode = self.options['MODE']
+        recorder = QueryRecorder()
+        if mode == 'sampling':
+            profiler = StackSampler(self.options['INTERVAL'])
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is active in this process
+                return self.get_response(request)
+
+        start = time.perf_counter()
+        try:
+            with recorder.record():
+                response = self.get_response(request)
+        finally:
+            duration = time.perf_counter() - start
+            if mode == 'sampling':
+                profiler.stop()
+            else:
+                profiler.disable()
+
+        if duration >= self.options['MIN_DURATION']:
+            record = self.save(request, response, mode, profiler, duration, recorder)
+            if record is not None:
+                response['X-Profile-Id'] = str(record.pk)
+        return response
+
+    def save(self, request, response, mode, profiler, duration, recorder):
+        match = request.resolver_match
+        record = RequestProfile(
+            view_name=match.view_name if match else '',
+            path=request.get_full_path()[:500],
+            method=request.method,
+            status_code=response.status_code,
+            mode=mode,
+            duration=duration,
+            sql_time=recorder.duration,
+            sql_count=recorder.count,
+        )
+        if mode == 'sampling':
+            record.stacks = profiler.collapsed()
+            record.template_time = profiler.template_time()
+        else:
+            profiler.create_stats()
+            record.stats = marshal.dumps(profiler.stats)
+            record.template_time = template_time(profiler.stats)
+        try:
+            record.save()
+            self.prune()
+        except Exception:
+            logger.warning("Could not store request profile", exc_info=True)
+            return None
+        return record
+
+    def prune(self):
+        """Delete all but the ``KEEP`` newest profiles, on a random sample of calls.
+
+        Sampling rather than keying on the pk keeps it working across pk gaps
+        and concurrent workers.
+        """
+        keep = self.options['KEEP']
+        if keep and random.random() < 1 / PRUNE_EVERY:
+            oldest_kept = RequestProfile.objects.order_by('-pk').values_list('pk', flat=True)[keep - 1:keep]
+            RequestProfile.objects.filter(pk__lt=oldest_kept).delete()
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessBroker:
+    """Fan-out to subscribers living in this process.
+
+    Enough for a single ASGI server that also creates the notifications
+    (or eager Celery); use :class:`RedisBroker` once workers are separate.
+    """
+
+    def __init__(self, **options):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, user_id, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, payload)
+
+    @asynccontextmanager
+    async def subscription(self, user_id):
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[user_id].add(entry)
+        try:
+            yield _QueueSubscription(entry[1])
+        finally:
+            with self._lock:
+                self._subscribers[user_id].discard(entry)
+                if not self._subscribers[user_id]:
+                    del self._subscribers[user_id]
+
+
+class _QueueSubscription:
+    def __init__(self, queue):
+        self.queue = queue
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class RedisBroker:
+    """Redis pub/sub, one channel per user, shared by every web and worker process."""
+
+    def __init__(self, url='redis://127.0.0.1:6379/0', prefix='notifications', **options):
+        self.url = url
+        self.prefix = prefix
+        self._client = None
+
+    def channel(self, user_id):
+        return f'{self.prefix}:{user_id}'
+
+    def publish(self, user_id, payload):
+        import redis
+
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url)
+        self._client.publish(self.channel(user_id), json.dumps(payload))
+
+    @asynccontextmanager
+    async def subscription(self, user_id):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel(user_id))
+        try:
+            yield _RedisSubscription(pubsub)
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+            await client.aclose()
+
+
+class _RedisSubscription:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def get(self, timeout):
+        message = await self.pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message['data'])
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    config = getattr(settings, 'NOTIFICATION_PUSH', {})
+    backend = import_string(config.get('BACKEND', 'service.push.InProcessBroker'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+def publish(user_id, payload):
+    """Push ``payload`` to ``user_id``'s open streams; never fails the caller."""
+    try:
+        get_broker().publish(user_id, payload)
+    except Exception:
+        logger.warning("Could not push notification to user %s", user_id, exc_info=True)
+
+
+def serialize(notification):
+    return {
+        "id": notification.id,
+        "message": notification.message,
+        "created_at": notification.created_at.strftime("%b %d, %H:%M"),
+        "read": notification.is_read,
+    }
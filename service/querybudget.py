@@ -0,0 +1,158 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'ACTION': 'log',        # or 'raise'
+    'MAX_QUERIES': 20,
+    'MAX_DUPLICATES': 3,    # executions of one fingerprint, i.e. an N+1
+    'MAX_SQL_TIME': 0.25,   # seconds
+    'VIEWS': {},            # view name -> overrides of the limits above
+}
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'QUERY_BUDGET', {})}
+
+
+def limits(view_name):
+    options = config()
+    return {**{key: options[key] for key in ('MAX_QUERIES', 'MAX_DUPLICATES', 'MAX_SQL_TIME')},
+            **options['VIEWS'].get(view_name, {})}
+
+
+def fingerprint(sql):
+    """``sql`` with literals and IN-lists collapsed, so per-row lookups group together."""
+    return _LITERAL.sub('?', _IN_LIST.sub('IN (...)', sql))
+
+
+class QueryRecorder:
+    """Counts queries, SQL time and fingerprints on this thread's connections."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self._connections = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def start(self):
+        self._connections = [connections[alias] for alias in connections]
+        for connection in self._connections:
+            connection.execute_wrappers.append(self)
+
+    def stop(self):
+        for connection in self._connections:
+            connection.execute_wrappers.remove(self)
+        self._connections = []
+
+    @contextmanager
+    def record(self):
+        self.start()
+        try:
+            yield self
+        finally:
+            self.stop()
+
+    def duplicates(self, threshold=2):
+        return [(sql, n) for sql, n in self.fingerprints.most_common() if n >= threshold]
+
+    def over_budget(self, max_queries=None, max_duplicates=None, max_sql_time=None):
+        """Human-readable descriptions of every exceeded limit."""
+        problems = []
+        if max_queries is not None and self.count > max_queries:
+            problems.append(f"{self.count} queries (budget {max_queries})")
+        if max_sql_time is not None and self.duration > max_sql_time:
+            problems.append(f"{self.duration * 1000:.0f}ms of SQL (budget {max_sql_time * 1000:.0f}ms)")
+        if max_duplicates is not None:
+            for sql, n in self.duplicates(max_duplicates + 1):
+                problems.append(f"{n}x {sql[:200]}")
+        return problems
+
+
+class QueryBudgetMiddleware:
+    """Log, or raise, when a view goes over its ``QUERY_BUDGET``."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not config()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        self.check(request, recorder)
+        return response
+
+    async def __acall__(self, request):
+        # Sync views and sync_to_async calls share one thread per request;
+        # the wrapper has to be installed on that thread's connections.
+        recorder = QueryRecorder()
+        await sync_to_async(recorder.start)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.stop)()
+        self.check(request, recorder)
+        return response
+
+    def check(self, request, recorder):
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        view_limits = limits(view_name)
+        problems = recorder.over_budget(
+            view_limits['MAX_QUERIES'], view_limits['MAX_DUPLICATES'], view_limits['MAX_SQL_TIME'])
+        if not problems:
+            return
+        message = f"{view_name} over query budget: " + '; '.join(problems)
+        if config()['ACTION'] == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class QueryBudgetMixin:
+    """``TestCase`` mixin asserting query ceilings rather than exact counts."""
+
+    @contextmanager
+    def assertMaxQueries(self, max_queries, max_duplicates=None):
+        recorder = QueryRecorder()
+        with recorder.record():
+            yield recorder
+        problems = recorder.over_budget(max_queries, max_duplicates)
+        if problems:
+            queries = '\n'.join(f"{n}x {sql}" for sql, n in recorder.fingerprints.most_common())
+            self.fail('; '.join(problems) + '\n' + queries)
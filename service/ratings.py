@@ -0,0 +1,51 @@
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from . import fragments, pagecache
+from .models import CompanyProfile, ServiceRequest, ServiceType, TechnicianProfile
+
+# Aggregate model -> the ServiceRequest foreign key it is rolled up by.
+AGGREGATES = (
+    (ServiceType, 'service_type_id'),
+    (CompanyProfile, 'company_id'),
+    (TechnicianProfile, 'technician_id'),
+)
+
+
+def apply_rating(service_request, old_rating, new_rating):
+    """Fold a rating change on ``service_request`` into the stored aggregates."""
+    count_delta = (new_rating is not None) - (old_rating is not None)
+    sum_delta = (new_rating or 0) - (old_rating or 0)
+    if not count_delta and not sum_delta:
+        return
+    for model, fk in AGGREGATES:
+        pk = getattr(service_request, fk)
+        if pk is None:
+            continue
+        model.objects.filter(pk=pk).update(
+            rating_count=F('rating_count') + count_delta,
+            rating_sum=F('rating_sum') + sum_delta,
+        )
+    fragments.bump('catalog', [service_request.company_id])
+    pagecache.invalidate('catalog')
+
+
+def recompute_ratings(batch_size=1000):
+    """Rebuild every rating aggregate from ``ServiceRequest.rating``."""
+    rated = ServiceRequest.objects.filter(rating__isnull=False)
+    updated = {}
+    with transaction.atomic():
+        for model, fk in AGGREGATES:
+            model.objects.exclude(rating_count=0, rating_sum=0).update(rating_count=0, rating_sum=0)
+            rows = (
+                rated.exclude(**{f'{fk}__isnull': True})
+                .values(fk)
+                .annotate(n=Count('id'), total=Sum('rating'))
+                .order_by()
+            )
+            objs = [model(pk=row[fk], rating_count=row['n'], rating_sum=row['total']) for row in rows]
+            model.objects.bulk_update(objs, ['rating_count', 'rating_sum'], batch_size=batch_size)
+            updated[model.__name__] = len(objs)
+    fragments.invalidate_all()
+    pagecache.invalidate('catalog')
+    return updated
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import ServiceRequest, StatusCounter
+
+STATUSES = [key for key, _ in ServiceRequest.STATUS_CHOICES]
+
+
+def counters_enabled():
+    return getattr(settings, 'SERVICE_STATUS_COUNTERS', False)
+
+
+def _with_total(counts):
+    counts = {status: counts.get(status) or 0 for status in STATUSES}
+    counts['total'] = sum(counts.values())
+    return counts
+
+
+def aggregate_status_counts(company):
+    """Count every status for ``company`` with a single grouped scan."""
+    counts = ServiceRequest.objects.filter(company=company).aggregate(
+        **{status: Count('id', filter=Q(status=status)) for status in STATUSES}
+    )
+    return _with_total(counts)
+
+
+def company_status_counts(company):
+    """Per-status counts (plus ``total``) for the company dashboard.
+
+    Reads the persistent counter table when ``SERVICE_STATUS_COUNTERS`` is on,
+    otherwise falls back to one aggregate query over the company's requests.
+    """
+    if not counters_enabled():
+        return aggregate_status_counts(company)
+    counts = dict(
+        StatusCounter.objects.filter(company=company).values_list('status', 'count')
+    )
+    return _with_total(counts)
+
+
+def _bump(company_id, status, delta):
+    updated = StatusCounter.objects.filter(
+        company_id=company_id, status=status
+    ).update(count=F('count') + delta)
+    if not updated:
+        StatusCounter.objects.get_or_create(company_id=company_id, status=status)
+        StatusCounter.objects.filter(
+            company_id=company_id, status=status
+        ).update(count=F('count') + delta)
+
+
+def record_transition(company_id, old_status, new_status, amount=1):
+    """Move ``amount`` requests of ``company_id`` from one status to another.
+
+    ``old_status`` is ``None`` for newly created requests and ``new_status`` is
+    ``None`` for deleted ones.
+    """
+    if not counters_enabled() or old_status == new_status or not amount:
+        return
+    if old_status is not None:
+        _bump(company_id, old_status, -amount)
+    if new_status is not None:
+        _bump(company_id, new_status, amount)
+
+
+def rebuild_counters(company_ids=None):
+    """Recompute the counter table from ``ServiceRequest``; returns rows written."""
+    requests = ServiceRequest.objects.all()
+    counters = StatusCounter.objects.all()
+    if company_ids is not None:
+        requests = requests.filter(company_id__in=company_ids)
+        counters = counters.filter(company_id__in=company_ids)
+
+    rows = [
+        StatusCounter(company_id=row['company_id'], status=row['status'], count=row['n'])
+        for row in requests.values('company_id', 'status').annotate(n=Count('id')).order_by()
+    ]
+    with transaction.atomic():
+        counters.delete()
+        StatusCounter.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
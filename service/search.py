@@ -0,0 +1,179 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+
+TABLE = 'service_search'
+
+# bm25/ts_rank weights: service name > company name > description.
+SQLITE_CREATE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    "name, description, company_name, company_id UNINDEXED, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+SQLITE_RANK = f"bm25({TABLE}, 10.0, 1.0, 5.0)"
+
+POSTGRES_CREATE = [
+    f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+    "rowid bigint PRIMARY KEY, company_id bigint NOT NULL, document tsvector NOT NULL)",
+    f"CREATE INDEX IF NOT EXISTS {TABLE}_document_idx ON {TABLE} USING GIN (document)",
+]
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('simple', s.name), 'A') || "
+    "setweight(to_tsvector('simple', c.company_name), 'B') || "
+    "setweight(to_tsvector('simple', s.description), 'C')"
+)
+
+SOURCE = (
+    "FROM service_servicetype s "
+    "JOIN service_companyprofile c ON c.id = s.company_id"
+)
+
+
+def max_results():
+    return getattr(settings, 'SERVICE_SEARCH_MAX_RESULTS', 500)
+
+
+def supported(conn=None):
+    return (conn or connection).vendor in ('sqlite', 'postgresql')
+
+
+def create_index(conn):
+    if conn.vendor == 'sqlite':
+        statements = [SQLITE_CREATE]
+    elif conn.vendor == 'postgresql':
+        statements = POSTGRES_CREATE
+    else:
+        return
+    with conn.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def drop_index(conn):
+    if supported(conn):
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+def _where(column, ids):
+    if ids is None:
+        return '', []
+    return f" WHERE {column} IN ({', '.join(['%s'] * len(ids))})", list(ids)
+
+
+def _write(where, params, conn):
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            # FTS5 has no upsert; delete then re-insert the affected rows.
+            cursor.execute(
+                f"DELETE FROM {TABLE} WHERE rowid IN (SELECT s.id {SOURCE}{where})", params)
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, name, description, company_name, company_id) "
+                f"SELECT s.id, s.name, s.description, c.company_name, s.company_id {SOURCE}{where}",
+                params,
+            )
+        else:
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, company_id, document) "
+                f"SELECT s.id, s.company_id, {POSTGRES_DOCUMENT} {SOURCE}{where} "
+                "ON CONFLICT (rowid) DO UPDATE "
+                "SET company_id = EXCLUDED.company_id, document = EXCLUDED.document",
+                params,
+            )
+
+
+def index_services(service_ids, conn=None):
+    """(Re)index the given ``ServiceType`` ids."""
+    conn = conn or connection
+    service_ids = list(service_ids)
+    if service_ids and supported(conn):
+        where, params = _where('s.id', service_ids)
+        _write(where, params, conn)
+
+
+def index_company(company_id, conn=None):
+    """Reindex every service of a company, e.g. after it was renamed."""
+    conn = conn or connection
+    if supported(conn):
+        _write(" WHERE s.company_id = %s", [company_id], conn)
+
+
+def remove_services(service_ids, conn=None):
+    conn = conn or connection
+    service_ids = list(service_ids)
+    if service_ids and supported(conn):
+        where, params = _where('rowid', service_ids)
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE}{where}", params)
+
+
+def reindex_all(conn=None):
+    """Rebuild the whole index; returns the number of indexed services."""
+    conn = conn or connection
+    if not supported(conn):
+        return 0
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+    _write('', [], conn)
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {TABLE}")
+        return cursor.fetchone()[0]
+
+
+def terms(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def ranked_ids(text, company_id=None, limit=None):
+    """Best-first ``ServiceType`` ids matching every term of ``text`` as a prefix."""
+    words = terms(text)
+    if not words:
+        return []
+    limit = limit or max_results()
+    company_filter = ''
+    if company_id:
+        company_filter = ' AND company_id = %s'
+    if connection.vendor == 'sqlite':
+        sql = (
+            f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s{company_filter} "
+            f"ORDER BY {SQLITE_RANK} LIMIT %s"
+        )
+        query = ' '.join(f'"{word}"*' for word in words)
+    else:
+        sql = (
+            f"SELECT rowid FROM {TABLE} WHERE document @@ to_tsquery('simple', %s){company_filter} "
+            f"ORDER BY ts_rank(document, to_tsquery('simple', %s)) DESC LIMIT %s"
+        )
+        query = ' & '.join(f'{word}:*' for word in words)
+    params = [query] + ([int(company_id)] if company_id else [])
+    if connection.vendor != 'sqlite':
+        params.append(query)
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_services(queryset, text, company_id=None):
+    """Filter a ``ServiceType`` queryset to ``text`` matches, best match first.
+
+    Matches service name, description and company name. Backends without a
+    full-text index fall back to ``icontains`` on the same fields.
+    """
+    if not terms(text):
+        return queryset
+    if not supported():
+        lookup = Q()
+        for word in terms(text):
+            lookup &= (Q(name__icontains=word) | Q(description__icontains=word)
+                       | Q(company__company_name__icontains=word))
+        return queryset.filter(lookup)
+
+    ids = ranked_ids(text, company_id=company_id)
+    if not ids:
+        return queryset.none()
+    rank = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+                output_field=IntegerField())
+    return queryset.filter(pk__in=ids).annotate(search_rank=rank).order_by('search_rank', 'id')
@@ -0,0 +1,80 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import fragments, images, pagecache, ratings, rollups, search
+from .models import CompanyProfile, CustomerProfile, ServiceRequest, ServiceType, TechnicianProfile
+
+
+@receiver(post_init, sender=ServiceRequest)
+def remember_loaded_state(sender, instance, **kwargs):
+    # Deferred loads (``.only()``) must not trigger an extra query here.
+    instance._loaded_status = instance.__dict__.get('status')
+    instance._loaded_rating = instance.__dict__.get('rating')
+
+
+@receiver(post_save, sender=ServiceRequest)
+def count_status_change(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_transition(instance.company_id, None, instance.status)
+    elif instance._loaded_status is not None:
+        rollups.record_transition(instance.company_id, instance._loaded_status, instance.status)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=ServiceRequest)
+def count_status_delete(sender, instance, **kwargs):
+    rollups.record_transition(instance.company_id, instance._loaded_status, None)
+    ratings.apply_rating(instance, instance._loaded_rating, None)
+
+
+@receiver(post_save, sender=ServiceType)
+def index_service(sender, instance, **kwargs):
+    search.index_services([instance.pk])
+    fragments.bump('requests', [instance.company_id])
+    pagecache.invalidate('catalog')
+
+
+@receiver(post_delete, sender=ServiceType)
+def unindex_service(sender, instance, **kwargs):
+    search.remove_services([instance.pk])
+    pagecache.invalidate('catalog')
+
+
+@receiver(post_init, sender=CompanyProfile)
+def remember_company_name(sender, instance, **kwargs):
+    instance._loaded_company_name = instance.__dict__.get('company_name')
+
+
+@receiver(post_save, sender=CompanyProfile)
+def reindex_company(sender, instance, created, **kwargs):
+    if not created and instance._loaded_company_name != instance.company_name:
+        search.index_company(instance.pk)
+        fragments.bump('catalog', [instance.pk])
+    instance._loaded_company_name = instance.company_name
+    pagecache.invalidate('catalog')
+
+
+@receiver(post_delete, sender=CompanyProfile)
+def uncache_company(sender, instance, **kwargs):
+    pagecache.invalidate('catalog')
+
+
+# Cached fragments show these names without the fragment's own row changing.
+@receiver(post_save, sender=TechnicianProfile)
+@receiver(post_delete, sender=TechnicianProfile)
+def technician_fragments(sender, instance, **kwargs):
+    fragments.bump('requests', [instance.company_id])
+
+
+@receiver(post_save, sender=CustomerProfile)
+def customer_fragments(sender, instance, created, **kwargs):
+    if not created:
+        fragments.bump('requests', ServiceRequest.objects.filter(
+            customer=instance).values_list('company_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=ServiceType)
+@receiver(post_save, sender=CompanyProfile)
+def schedule_image_variants(sender, instance, **kwargs):
+    if images.needs_variants(instance):
+        images.schedule(instance)
@@ -1,25 +1,56 @@
+from collections import Counter
+from datetime import timedelta
 from celery import shared_task
-from django.core.mail import send_mail
+from django.utils import timezone
 from django.conf import settings
 from .models import Notification
-from django.contrib.auth import get_user_model
+from . import feed, images, invoices, mailer, onboarding, push
 # from django.shortcuts import get_object_or_404
 
 @shared_task
 def send_custom_email(subject, message, email):
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.EMAIL_HOST_USER,
-            [email],
-            fail_silently=True
-        )
-        return "Email sent"
-    except Exception as e:
-        return f"Error: {str(e)}"
-@shared_task  
+    return send_bulk_email([[subject, message, email]])
+
+@shared_task
+def send_bulk_email(messages, attempt=0):
+    """Send a batch over one SMTP connection, retrying failures with backoff."""
+    failed = mailer.deliver(messages)
+    config = getattr(settings, 'EMAIL_BATCH', {})
+    if failed and attempt < config.get('MAX_RETRIES', 4):
+        send_bulk_email.apply_async(
+            (failed,), {'attempt': attempt + 1},
+            countdown=config.get('RETRY_BACKOFF', 30) * 2 ** attempt)
+    return {"sent": len(messages) - len(failed), "failed": len(failed)}
+
+@shared_task
 def create_notification(user_id, message):
-    User = get_user_model()
-    user = User.objects.get(id=user_id)
-    Notification.objects.create(user=user, message=message)
\ No newline at end of file
+    create_notifications([[user_id, message]])
+
+@shared_task
+def create_notifications(rows):
+    notifications = Notification.objects.bulk_create(
+        [Notification(user_id=user_id, message=message) for user_id, message in rows])
+    for user_id, count in Counter(n.user_id for n in notifications).items():
+        feed.incr_unread(user_id, count)
+    for notification in notifications:
+        push.publish(notification.user_id, push.serialize(notification))
+    return len(notifications)
+
+@shared_task
+def reconcile_unread_counters(window_minutes=60):
+    since = timezone.now() - timedelta(minutes=window_minutes)
+    return feed.reconcile_unread(since)
+
+@shared_task
+def generate_image_variants(items):
+    return sum(images.generate(label, pk) for label, pk in items)
+
+
+@shared_task
+def render_invoices(items):
+    return invoices.render_invoices([pk for pk, in items])
+
+
+@shared_task
+def import_technicians(items):
+    return sum(onboarding.run_queued(company_id, rows) for company_id, rows in items)
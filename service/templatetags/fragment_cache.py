@@ -0,0 +1,48 @@
+import logging
+
+from django import template
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from service import metrics
+from service.fragments import config
+
+logger = logging.getLogger(__name__)
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        key = make_template_fragment_key(self.name, [var.resolve(context) for var in self.vary_on])
+        value = cache.get(key)
+        metrics.cache_lookup(f'fragment:{self.name}', value is not None)
+        if value is None:
+            value = self.nodelist.render(context)
+            if 'csrfmiddlewaretoken' in value:
+                # The token belongs to one user's session; never share it.
+                logger.warning("Fragment %r contains a CSRF token and was not cached", self.name)
+            else:
+                cache.set(key, value, config()['TIMEOUT'])
+        return value
+
+
+@register.tag
+def fragment(parser, token):
+    """Cache the enclosed, user-independent HTML under a name and version values::
+
+        {% fragment 'service-card' s.pk s.fragment_version %} ... {% endfragment %}
+
+    The version values must change whenever the output would, see
+    ``service.fragments.stamp``.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' needs a name and at least one version value.")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, bits[1].strip('\'"'), [parser.compile_filter(bit) for bit in bits[2:]])
@@ -0,0 +1,35 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from service.images import current_variants
+
+register = template.Library()
+
+
+def _srcset(storage, sizes, ext):
+    by_width = {entry['width']: storage.url(entry[ext]) for entry in sizes.values()}
+    return ', '.join(f'{url} {width}w' for width, url in sorted(by_width.items()))
+
+
+@register.simple_tag
+def picture(field_file, variants, size, sizes='100vw', **attrs):
+    """A ``<picture>`` with WebP and JPEG ``srcset``s of ``field_file``'s variants::
+
+        {% picture s.image s.image_variants 'card' sizes='25vw' alt=s.name loading='lazy' %}
+
+    ``size`` is the fallback ``src``; until the variants exist it is a plain
+    ``<img>`` of the original upload.
+    """
+    if not field_file:
+        return ''
+    variant_sizes = current_variants(field_file, variants)
+    if variant_sizes is None:
+        return format_html('<img src="{}"{}>', field_file.url, flatatt(attrs))
+    storage = field_file.storage
+    fallback = variant_sizes[size]
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}"{}></picture>',
+        _srcset(storage, variant_sizes, 'webp'), sizes, storage.url(fallback['jpg']),
+        _srcset(storage, variant_sizes, 'jpg'), sizes, fallback['width'], fallback['height'], flatatt(attrs))
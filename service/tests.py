@@ -1,3 +1,1215 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (CompanyProfile, CustomerProfile, Invoice, Notification, Outbox, RequestProfile,
+                     ServiceRequest, ServiceType, StatusCounter, TechnicianProfile)
+from PIL import Image
+
+from . import (delivery, dispatch, feed, images, invoices, mailer, metrics, onboarding, outbox, pagecache,
+               profiling, push, search, tasks)
+from .benchmarks import URL_CEILINGS
+from .dispatch import dispatch_backlog, rank_technicians
+from .lifecycle import transition, transition_many
+from .notify import TASK as NOTIFY_TASK, notify, notify_each
+from .pagination import CursorPaginator
+from .querybudget import QueryBudgetMixin
+from .ratings import recompute_ratings
+from .search import search_services
+from .rollups import aggregate_status_counts, company_status_counts, rebuild_counters
+from .urls import urlpatterns
+from .workload import load_workloads
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN is SQLite specific")
+class DashboardQueryPlanTests(TestCase):
+    """Every hot dashboard query must be answered from an index, not a table scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        company_user = User.objects.create_user('acme', 'acme@example.com', 'pw', role='company')
+        cls.company = CompanyProfile.objects.create(
+            user=company_user, company_name='Acme', phone='9000000001', address='x')
+        cls.customer_user = User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer')
+        cls.customer = CustomerProfile.objects.create(
+            user=cls.customer_user, cust_name='Bob', phone='9000000002', address='x')
+        service = ServiceType.objects.create(company=cls.company, name='Plumbing', base_price=100)
+        tech_user = User.objects.create_user('tom', 'tom@example.com', 'pw', role='technician')
+        cls.technician = TechnicianProfile.objects.create(
+            user=tech_user, company=cls.company, name='Tom', phone='9000000003')
+        ServiceRequest.objects.bulk_create([
+            ServiceRequest(customer=cls.customer, company=cls.company, service_type=service,
+                           technician=cls.technician, base_price=100,
+                           preferred_date=date(2026, 1, day % 28 + 1),
+                           status=ServiceRequest.STATUS_CHOICES[day % 9][0])
+            for day in range(50)
+        ])
+        Notification.objects.bulk_create(
+            [Notification(user=cls.customer_user, message=str(i), is_read=i % 2 == 0) for i in range(50)])
+
+    def assertUsesIndex(self, queryset, table, ordered=False):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        steps = [step for step in plan if f' {table} ' in f'{step} ']
+        self.assertTrue(steps, plan)
+        for step in steps:
+            self.assertIn('USING', step, plan)
+            self.assertNotRegex(step, r'^SCAN \w+$', plan)
+        if ordered:
+            self.assertFalse([step for step in plan if 'TEMP B-TREE' in step], plan)
+
+    def keyset_page(self, queryset, ordering):
+        paginator = CursorPaginator(queryset, 10, ordering)
+        first = paginator.page()
+        _, values = paginator.decode(paginator.encode('n', first[-1]))
+        return queryset.order_by(*paginator._order_by(reverse=False)).filter(
+            paginator._keyset_filter(values, forward=True))[:11]
+
+    def test_company_status_rollup(self):
+        with self.assertNumQueries(1):
+            aggregate_status_counts(self.company)
+        self.assertUsesIndex(
+            ServiceRequest.objects.filter(company=self.company).values('status'),
+            'service_servicerequest')
+
+    def test_company_dashboard_pages(self):
+        requests = ServiceRequest.objects.filter(company=self.company)
+        for queryset in (requests, requests.filter(status='requested')):
+            self.assertUsesIndex(
+                self.keyset_page(queryset, ('-preferred_date', 'id')), 'service_servicerequest',
+                ordered=True)
+
+    def test_technician_duties(self):
+        self.assertUsesIndex(
+            ServiceRequest.objects.filter(
+                technician__in=[self.technician.pk], status__in=ServiceRequest.DUTY_STATUSES
+            ).order_by('preferred_date'),
+            'service_servicerequest')
+
+    def test_technician_dashboard(self):
+        self.assertUsesIndex(
+            ServiceRequest.objects.filter(technician=self.technician, status='accepted'),
+            'service_servicerequest')
+
+    def test_customer_requests_pages(self):
+        self.assertUsesIndex(
+            self.keyset_page(ServiceRequest.objects.filter(customer=self.customer), ('-created_at', 'id')),
+            'service_servicerequest', ordered=True)
+
+    def test_unread_notifications(self):
+        self.assertUsesIndex(
+            Notification.objects.filter(user=self.customer_user, is_read=False).order_by('-created_at'),
+            'service_notification', ordered=True)
+
+    def test_requested_backlog(self):
+        self.assertUsesIndex(
+            ServiceRequest.objects.filter(company=self.company, status='requested').order_by('created_at'),
+            'service_servicerequest', ordered=True)
+
+
+@override_settings(SERVICE_STATUS_COUNTERS=True)
+class StatusCounterTests(TestCase):
+    """The counter table follows every way a request's status changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = CompanyProfile.objects.create(
+            user=User.objects.create_user('acme', 'acme@example.com', 'pw', role='company'),
+            company_name='Acme', phone='9000000001', address='x')
+        cls.customer = CustomerProfile.objects.create(
+            user=User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer'),
+            cust_name='Bob', phone='9000000002', address='x')
+        cls.service = ServiceType.objects.create(company=cls.company, name='Plumbing', base_price=100)
+
+    def assertCountersExact(self):
+        self.assertEqual(company_status_counts(self.company), aggregate_status_counts(self.company))
+
+    def test_create_save_transition_and_delete(self):
+        requests = [ServiceRequest.objects.create(customer=self.customer, company=self.company,
+                                                  service_type=self.service, base_price=100)
+                    for _ in range(3)]
+        self.assertEqual(company_status_counts(self.company)['requested'], 3)
+        self.assertCountersExact()
+
+        requests[0].status = 'cancelled'
+        requests[0].save()
+        self.assertCountersExact()
+        transition(requests[1], 'assigned')
+        self.assertCountersExact()
+        self.assertEqual(transition_many(ServiceRequest.objects.all(), 'cancelled'), 2)
+        self.assertCountersExact()
+        requests[2].refresh_from_db()
+        requests[2].delete()
+        counts = company_status_counts(self.company)
+        self.assertEqual((counts['cancelled'], counts['total']), (2, 2))
+        self.assertCountersExact()
+
+    def test_rebuild_repairs_drift(self):
+        ServiceRequest.objects.create(customer=self.customer, company=self.company,
+                                      service_type=self.service, base_price=100)
+        ServiceRequest.objects.filter(company=self.company).update(status='paid')  # bypasses the signals
+        StatusCounter.objects.create(company=self.company, status='rejected', count=7)
+        self.assertNotEqual(company_status_counts(self.company), aggregate_status_counts(self.company))
+        self.assertEqual(rebuild_counters([self.company.pk]), 1)
+        self.assertCountersExact()
+
+
+@override_settings(SERVICE_STATUS_COUNTERS=True)
+class LifecycleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        company_user = User.objects.create_user('acme', 'acme@example.com', 'pw', role='company')
+        cls.company = CompanyProfile.objects.create(
+            user=company_user, company_name='Acme', phone='9000000001', address='x')
+        customer = CustomerProfile.objects.create(
+            user=User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer'),
+            cust_name='Bob', phone='9000000002', address='x')
+        cls.service = ServiceType.objects.create(company=cls.company, name='Plumbing', base_price=100)
+        cls.technician = TechnicianProfile.objects.create(
+            user=User.objects.create_user('tom', 'tom@example.com', 'pw', role='technician'),
+            company=cls.company, name='Tom', phone='9000000003')
+        for _ in range(3):
+            ServiceRequest.objects.create(customer=customer, company=cls.company,
+                                          service_type=cls.service, base_price=100)
+
+    def assertCountersExact(self):
+        self.assertEqual(company_status_counts(self.company), aggregate_status_counts(self.company))
+
+    def test_only_first_concurrent_transition_wins(self):
+        pk = ServiceRequest.objects.values_list('pk', flat=True).first()
+        first, second = ServiceRequest.objects.get(pk=pk), ServiceRequest.objects.get(pk=pk)
+        self.assertTrue(transition(first, 'assigned', technician=self.technician))
+        self.assertTrue(transition(first, 'accepted'))
+        self.assertFalse(transition(second, 'assigned', technician=None))
+        self.assertEqual(second.status, 'requested')
+        row = ServiceRequest.objects.get(pk=pk)
+        self.assertEqual((row.status, row.technician_id), ('accepted', self.technician.pk))
+        self.assertCountersExact()
+
+    def test_disallowed_transition_is_refused_without_query(self):
+        service_request = ServiceRequest.objects.first()
+        with self.assertNumQueries(0):
+            self.assertFalse(transition(service_request, 'paid'))
+
+    def test_batch_transition_skips_ineligible_rows(self):
+        first = ServiceRequest.objects.first()
+        transition(first, 'assigned', technician=self.technician)
+        transition(first, 'accepted')
+        moved = transition_many(ServiceRequest.objects.all(), 'assigned', technician=self.technician)
+        self.assertEqual(moved, 2)
+        self.assertEqual(ServiceRequest.objects.filter(status='assigned').count(), 2)
+        self.assertCountersExact()
+
+
+@override_settings(NOTIFICATION_PUSH={'BACKEND': 'service.push.InProcessBroker'})
+class QueryCeilingTests(QueryBudgetMixin, TestCase):
+    """A GET of every URL stays under its ceiling; an N+1 in a list page breaks it."""
+
+    CEILINGS = URL_CEILINGS
+
+    @classmethod
+    def setUpTestData(cls):
+        company_user = User.objects.create_user('acme', 'acme@example.com', 'pw', role='company')
+        cls.company = CompanyProfile.objects.create(
+            user=company_user, company_name='Acme', phone='9000000001', address='x')
+        customer = CustomerProfile.objects.create(
+            user=User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer'),
+            cust_name='Bob', phone='9000000002', address='x')
+        cls.services = [ServiceType.objects.create(company=cls.company, name=f'Service {i}', base_price=100)
+                        for i in range(3)]
+        cls.technicians = []
+        for i in range(4):
+            technician = TechnicianProfile.objects.create(
+                user=User.objects.create_user(f'tech{i}', f'tech{i}@example.com', 'pw', role='technician'),
+                company=cls.company, name=f'Tech {i}', phone=f'900000010{i}')
+            technician.service_types.set(cls.services)
+            cls.technicians.append(technician)
+        cls.requests = {}
+        for i, status in enumerate([key for key, _ in ServiceRequest.STATUS_CHOICES] * 2):
+            cls.requests[status] = ServiceRequest.objects.create(
+                customer=customer, company=cls.company, service_type=cls.services[i % 3],
+                technician=None if status == 'requested' else cls.technicians[0],
+                base_price=100, status=status)
+        cls.users = {'company': company_user, 'customer': customer.user,
+                     'technician': cls.technicians[0].user}
+
+    def url_kwargs(self, pattern):
+        request_id = self.requests['payment_pending'].pk
+        values = {'id': self.company.pk, 'service_id': self.services[0].pk, 'pk': self.services[0].pk,
+                  'tech_id': self.technicians[1].pk, 'request_id': request_id, 'status': 'accepted'}
+        if pattern.name == 'mark_payment_pending':
+            values['pk'] = self.requests['completed'].pk
+        if pattern.name == 'update_request_status':
+            values['request_id'] = self.requests['assigned'].pk
+        return {name: values[name] for name in pattern.pattern.converters}
+
+    def test_every_url_has_a_ceiling(self):
+        self.assertEqual({pattern.name for pattern in urlpatterns}, set(self.CEILINGS))
+
+    def test_query_ceilings(self):
+        for pattern in urlpatterns:
+            who, ceiling = self.CEILINGS[pattern.name]
+            with self.subTest(pattern.name):
+                self.client.logout()
+                if who:
+                    self.client.force_login(self.users[who])
+                url = reverse(pattern.name, kwargs=self.url_kwargs(pattern))
+                with self.assertMaxQueries(ceiling, max_duplicates=2):
+                    response = self.client.get(url)
+                self.assertLess(response.status_code, 500)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(METRICS={'DIR': self.directory, 'TOKEN': 'secret'})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_exposition_sums_every_process(self):
+        other = {'counters': [['http_requests_total', [['view', 'home'], ['method', 'GET'], ['status', 200]], 5]],
+                 'histograms': []}
+        with open(os.path.join(self.directory, 'other.json'), 'w') as fh:
+            json.dump(other, fh)
+        self.client.get(reverse('home'))
+
+        body = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_requests_total{view="home",method="GET",status="200"} 6', body)
+        self.assertIn('http_request_duration_seconds_count{view="home"} 1', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="home",le="+Inf"} 1', body)
+
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+        with override_settings(METRICS={'DIR': self.directory, 'TOKEN': None}):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+            user = User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer')
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+            User.objects.filter(pk=user.pk).update(is_staff=True)
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+            with override_settings(DEBUG=True):
+                self.client.logout()
+                self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company_user = User.objects.create_user('acme', 'acme@example.com', 'pw', role='company')
+        cls.company = CompanyProfile.objects.create(
+            user=cls.company_user, company_name='Acme', phone='9000000001', address='x')
+        cls.customer = CustomerProfile.objects.create(
+            user=User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer'),
+            cust_name='Bob', phone='9000000002', address='x')
+        cls.service = ServiceType.objects.create(company=cls.company, name='Plumbing', base_price=100)
+        cls.technician = TechnicianProfile.objects.create(
+            user=User.objects.create_user('tech', 'tech@example.com', 'pw', role='technician'),
+            company=cls.company, name='Tess', phone='9000000003')
+        cls.completed = ServiceRequest.objects.create(
+            customer=cls.customer, company=cls.company, service_type=cls.service,
+            technician=cls.technician, base_price=100, status='completed')
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+
+    def lookups(self, name):
+        counters = metrics.registry.counters
+        return [counters.get(('cache_requests_total', (('use', f'fragment:{name}'), ('result', result))), 0)
+                for result in ('hit', 'miss')]
+
+    def test_cards_are_shared_and_follow_saves(self):
+        self.client.force_login(self.customer.user)
+        self.client.get(reverse('customer_dashboard'))
+        self.assertEqual(self.lookups('service-card'), [0, 1])
+        self.client.get(reverse('customer_dashboard'))
+        self.assertEqual(self.lookups('service-card'), [1, 1])
+
+        self.service.name = 'Drain cleaning'
+        self.service.save()
+        self.assertContains(self.client.get(reverse('customer_dashboard')), 'Drain cleaning')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company.company_name = 'Acme Home'
+            self.company.save()
+        self.assertContains(self.client.get(reverse('customer_dashboard')), 'Acme Home')
+
+    def test_rows_follow_related_names_and_keep_csrf_out(self):
+        self.client.force_login(self.company_user)
+        self.client.get(reverse('company_dashboard'))
+        cached = self.client.get(reverse('company_dashboard'))
+        self.assertEqual(self.lookups('request-row'), [1, 1])
+        # The completed request's approval form is rendered outside the cached row.
+        self.assertContains(cached, 'csrfmiddlewaretoken', count=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.technician.name = 'Tessa'
+            self.technician.save()
+        self.assertContains(self.client.get(reverse('company_dashboard')), 'Tessa')
+
+
+class PageCacheTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        company = CompanyProfile.objects.create(
+            user=User.objects.create_user('acme', 'acme@example.com', 'pw', role='company'),
+            company_name='Acme', phone='9000000001', address='x')
+        cls.service = ServiceType.objects.create(company=company, name='Plumbing', base_price=100)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_catalog_is_served_from_cache(self):
+        url = reverse('customer_dashboard')
+        first = self.client.get(url, {'search': 'plumb'})
+        self.assertEqual(first['Vary'], 'Cookie')
+        self.assertIn('stale-while-revalidate=', first['Cache-Control'])
+        with self.assertMaxQueries(0):
+            second = self.client.get(url, {'search': 'plumb'})
+        self.assertEqual(second.content, first.content)
+
+        not_modified = self.client.get(url, {'search': 'plumb'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertNotIn('ETag', self.client.get(url, {'search': 'plumb', 'utm_source': 'x'}))
+
+    def test_catalog_change_invalidates_after_serving_stale_once_locked(self):
+        url = reverse('customer_dashboard')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.name = 'Drain cleaning'
+            self.service.save()
+
+        # Another request is already re-rendering: the stale copy is served meanwhile.
+        key = pagecache._key('customer_dashboard', RequestFactory().get(url), ('search', 'company', 'cursor'))
+        cache.set(f'{key}:lock', 1)
+        self.assertNotContains(self.client.get(url), 'Drain cleaning')
+        cache.delete(f'{key}:lock')
+        self.assertContains(self.client.get(url), 'Drain cleaning')
+
+    def test_logged_in_users_bypass_the_cache(self):
+        user = User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer')
+        CustomerProfile.objects.create(user=user, cust_name='Bob', phone='9000000002', address='x')
+        self.client.force_login(user)
+        self.assertContains(self.client.get(reverse('customer_dashboard')), 'Welcome, Bob')
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+
+    def test_upload_is_queued_and_rendered_as_picture(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (2400, 1600), 'teal').save(buffer, 'JPEG', quality=95)
+        company = CompanyProfile.objects.create(
+            user=User.objects.create_user('acme', 'acme@example.com', 'pw', role='company'),
+            company_name='Acme', phone='9000000001', address='x')
+        service = ServiceType.objects.create(
+            company=company, name='Plumbing', image=SimpleUploadedFile('pipes.jpg', buffer.getvalue()))
+        self.assertEqual(Outbox.objects.get().payload, ['service.ServiceType', service.pk])
+
+        self.assertTrue(images.generate('service.ServiceType', service.pk))
+        self.assertFalse(images.generate('service.ServiceType', service.pk))
+        service.refresh_from_db()
+        card = service.image_variants['sizes']['card']
+        self.assertEqual((card['width'], card['height']), (480, 320))
+        self.assertEqual(Image.open(service.image.storage.open(card['webp'])).format, 'WEBP')
+
+        response = self.client.get(reverse('customer_dashboard'))
+        self.assertContains(response, '<source type="image/webp"', count=2)
+        self.assertNotContains(response, service.image.url + '"')
+
+
+class DeliveryTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        settings = override_settings(
+            STATIC_ROOT=os.path.join(self.root, 'static'), MEDIA_ROOT=os.path.join(self.root, 'media'),
+            STORAGES={'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                      'staticfiles': {'BACKEND': 'service.storage.CompressedManifestStaticFilesStorage'}})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_hashed_static_files_are_precompressed_and_immutable(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        hashed = staticfiles_storage.stored_name('js/notifications.js')
+        self.assertNotEqual(hashed, 'js/notifications.js')
+
+        response = delivery.static_file(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, br'), hashed)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        response = delivery.static_file(RequestFactory().get('/'), 'js/notifications.js')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_media_is_handed_off_to_the_front_server(self):
+        os.makedirs(os.path.join(self.root, 'media', 'derivatives'))
+        with open(os.path.join(self.root, 'media', 'derivatives', 'card.0123abcd.webp'), 'wb') as fh:
+            fh.write(b'RIFF')
+        with override_settings(DELIVERY={'BACKEND': 'x-accel'}):
+            response = self.client.get('/media/derivatives/card.0123abcd.webp')
+            with self.assertRaises(Http404):
+                delivery.media_file(RequestFactory().get('/'), '../../manage.py')
+        self.assertEqual(response['X-Accel-Redirect'], '/_protected/media/derivatives/card.0123abcd.webp')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response.content, b'')
+
+    def test_invoices_are_not_served_as_media(self):
+        os.makedirs(os.path.join(self.root, 'media', 'invoices', 'ab'))
+        with open(os.path.join(self.root, 'media', 'invoices', 'ab', 'x.pdf'), 'wb') as fh:
+            fh.write(b'%PDF')
+        for path in ('invoices/ab/x.pdf', './invoices/ab/x.pdf', 'derivatives/../invoices/ab/x.pdf',
+                     '/invoices/ab/x.pdf', '//invoices/ab/x.pdf', 'invoices/./ab/x.pdf'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                delivery.media_file(RequestFactory().get('/'), path)
+
+
+class InvoiceTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        company = CompanyProfile.objects.create(
+            user=User.objects.create_user('acme', 'acme@example.com', 'pw', role='company'),
+            company_name='Acme (Pune)', phone='9000000001', address='x')
+        self.customer = CustomerProfile.objects.create(
+            user=User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer'),
+            cust_name='Bob', phone='9000000002', address='x')
+        self.request = ServiceRequest.objects.create(
+            customer=self.customer, company=company, base_price=100, extra_charges=20,
+            service_type=ServiceType.objects.create(company=company, name='Plumbing', base_price=100),
+            status='payment_pending')
+
+    def test_paid_request_is_rendered_once_and_served_from_storage(self):
+        transition(self.request, 'paid', actual_price=120)
+        self.assertEqual(Outbox.objects.get(task=invoices.TASK).payload, [self.request.pk])
+        self.assertEqual(invoices.render_invoices([self.request.pk]), 1)
+        self.assertEqual(invoices.render_invoices([self.request.pk]), 0)
+        invoice = Invoice.objects.get()
+        self.assertEqual((invoice.number, invoice.total), (f'INV-{self.request.pk:08d}', 120))
+
+        self.client.force_login(self.customer.user)
+        url = reverse('invoice', args=[self.request.pk])
+        with self.assertNumQueries(4):  # session, user, request, invoice
+            html = b''.join(self.client.get(url).streaming_content)
+        self.assertIn(b'Acme (Pune)', html)
+        self.assertNotIn(b'csrfmiddlewaretoken', html)
+        response = self.client.get(url, {'format': 'pdf'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF-1.4'))
+        for prefix in ('', './', 'derivatives/../', '/'):
+            with self.subTest(prefix=prefix):
+                self.assertEqual(self.client.get(f'/media/{prefix}{invoice.path("pdf")}').status_code, 404)
+
+        self.client.force_login(User.objects.create_user('eve', 'eve@example.com', 'pw', role='customer'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('acme', 'acme@example.com', 'pw', role='company')
+        company = CompanyProfile.objects.create(user=user, company_name='Acme', phone='9000000001', address='x')
+        customer = CustomerProfile.objects.create(
+            user=User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer'),
+            cust_name='Bob, Jr.', phone='9000000002', address='x')
+        service = ServiceType.objects.create(company=company, name='Plumbing', base_price=100)
+        ServiceRequest.objects.bulk_create([
+            ServiceRequest(customer=customer, company=company, service_type=service, base_price=100,
+                           preferred_date=date(2026, 1, day + 1), status='paid' if day % 2 else 'requested')
+            for day in range(10)])
+        self.client.force_login(user)
+
+    def test_csv_is_streamed_with_filters(self):
+        response = self.client.get(reverse('export_requests'), {'status': 'paid', 'from': '2026-01-03'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:4], ['id', 'created_at', 'preferred_date', 'status'])
+        self.assertEqual([line.split(',')[2] for line in lines[1:]],
+                         ['2026-01-10', '2026-01-08', '2026-01-06', '2026-01-04'])
+        self.assertIn('"Bob, Jr."', lines[1])
+        self.assertEqual(self.client.get(reverse('export_requests'), {'to': 'yesterday'}).status_code, 400)
+
+    def test_command_writes_json_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'requests.jsonl')
+            call_command('export_requests', CompanyProfile.objects.get().pk, format='jsonl',
+                         output=path, chunk_size=3)
+            with open(path) as fh:
+                rows = [json.loads(line) for line in fh]
+        self.assertEqual(len(rows), 10)
+        self.assertEqual((rows[0]['preferred_date'], rows[0]['customer']), ('2026-01-10', 'Bob, Jr.'))
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('acme', 'acme@example.com', 'pw', role='company')
+        self.company = CompanyProfile.objects.create(
+            user=user, company_name='Acme', phone='9000000001', address='x')
+        self.client.force_login(user)
+
+    def upload(self, kind, content):
+        return self.client.post(reverse('bulk_import'), {
+            'kind': kind, 'file': SimpleUploadedFile(f'{kind}.csv', content.encode())})
+
+    def test_services_then_technicians(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload('services', "name,base_price,description\nPlumbing,100,Pipes\nWiring,250.50,\n")
+        self.assertRedirects(response, reverse('service_view'))
+        self.assertEqual(sorted(ServiceType.objects.values_list('name', flat=True)), ['Plumbing', 'Wiring'])
+        self.assertContains(self.client.get(reverse('customer_dashboard')), 'Wiring')
+
+        content = ("name,email,phone,service_types\n"
+                   "Tom,tom@example.com,9000000101,plumbing; Wiring\n"
+                   "Ann,ann@example.com,9000000102,\n")
+        response = self.upload('technicians', content)
+        self.assertRedirects(response, reverse('technician_list'), fetch_redirect_response=False)
+        self.assertFalse(TechnicianProfile.objects.exists())  # hashing is left to a worker
+        job = Outbox.objects.get(task=onboarding.TASK)
+        with self.assertNumQueries(9):  # however many rows
+            self.assertEqual(tasks.import_technicians([job.payload]), 2)
+        notice = Outbox.objects.get(task='service.tasks.create_notifications').payload
+        self.assertEqual(notice, [self.company.user_id, 'Imported 2 technicians from your CSV file.'])
+        tom = TechnicianProfile.objects.get(name='Tom')
+        self.assertEqual(tom.service_types.count(), 2)
+        self.assertEqual(tom.user.role, 'technician')
+        emails = Outbox.objects.filter(task='service.tasks.send_bulk_email')
+        self.assertEqual(sorted(payload[2] for payload in emails.values_list('payload', flat=True)),
+                         ['ann@example.com', 'tom@example.com'])
+        password = next(p[1] for p in emails.values_list('payload', flat=True) if p[2] == 'tom@example.com')
+        password = password.split('**Password:** ')[1].split()[0]
+        self.assertTrue(tom.user.check_password(password))
+
+    def test_any_bad_row_rejects_the_whole_file(self):
+        ServiceType.objects.create(company=self.company, name='Plumbing', base_price=100)
+        content = ("name,email,phone,service_types\n"
+                   "Tom,tom@example.com,9000000101,Plumbing\n"
+                   "Ann,not-an-email,123,Roofing\n"
+                   "Tim,tom@example.com,9000000101,\n")
+        response = self.upload('technicians', content)
+        self.assertContains(response, 'Line 3: phone')
+        self.assertContains(response, "has no service &#x27;Roofing&#x27;")
+        self.assertContains(response, 'Line 4: email: tom@example.com appears more than once')
+        self.assertFalse(TechnicianProfile.objects.exists())
+        self.assertFalse(Outbox.objects.exists())
+
+        content = ("name,base_price,image\n"
+                   "Wiring,250,service_images/missing.png\n"
+                   "Roofing,300,../../etc/passwd\n"
+                   "Painting,150,invoices/ab/x.pdf\n"
+                   "Tiling,200,service_images/../../etc/passwd\n")
+        response = self.upload('services', content)
+        self.assertContains(response, 'Line 2: image: no uploaded file')
+        self.assertContains(response, 'Line 3: image: &#x27;../../etc/passwd&#x27; is not under service_images/')
+        self.assertContains(response, 'Line 4: image: &#x27;invoices/ab/x.pdf&#x27; is not under service_images/')
+        self.assertContains(response, 'Line 5: image:')
+        self.assertEqual(ServiceType.objects.count(), 1)
+
+    def test_password_hashing_pool(self):
+        passwords = [f'secret{i}' for i in range(onboarding.POOL_THRESHOLD)]
+        hashes = onboarding.hash_passwords(passwords, workers=2)
+        self.assertEqual(len(set(hashes)), len(passwords))
+        self.assertTrue(check_password(passwords[0], hashes[0]))
+        self.assertTrue(check_password(passwords[-1], hashes[-1]))
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seed_then_benchmark_every_url(self):
+        call_command('seed_data', companies=1, technicians=3, customers=3, requests=60, notifications=10,
+                     stdout=io.StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmark.json')
+            call_command('bench_views', iterations=2, warmup=0, output=path, stdout=io.StringIO())
+            with open(path) as fh:
+                results = json.load(fh)['results']
+        self.assertEqual(set(results), {pattern.name for pattern in urlpatterns})
+        self.assertEqual([name for name, result in results.items() if result['status'] >= 500], [])
+
+
+class DispatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = CompanyProfile.objects.create(
+            user=User.objects.create_user('acme', 'acme@example.com', 'pw', role='company'),
+            company_name='Acme', phone='9000000001', address='x')
+        cls.customer = CustomerProfile.objects.create(
+            user=User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer'),
+            cust_name='Bob', phone='9000000002', address='x')
+        cls.plumbing = ServiceType.objects.create(company=cls.company, name='Plumbing', base_price=100)
+        cls.wiring = ServiceType.objects.create(company=cls.company, name='Wiring', base_price=100)
+        cls.tom = cls.technician(cls.company, 'tom', '9000000101', [cls.plumbing])
+        cls.other = CompanyProfile.objects.create(
+            user=User.objects.create_user('rival', 'rival@example.com', 'pw', role='company'),
+            company_name='Rival', phone='9000000003', address='x')
+        cls.outsider = cls.technician(cls.other, 'otto', '9000000201', [])
+
+    @classmethod
+    def technician(cls, company, name, phone, services, **fields):
+        technician = TechnicianProfile.objects.create(
+            user=User.objects.create_user(name, f'{name}@example.com', 'pw', role='technician'),
+            company=company, name=name.title(), phone=phone, **fields)
+        technician.service_types.set(services)
+        return technician
+
+    def service_request(self, service=None, **fields):
+        return ServiceRequest.objects.create(
+            customer=self.customer, company=self.company, service_type=service or self.plumbing,
+            base_price=100, **fields)
+
+    def test_ranking_prefers_skilled_free_technicians(self):
+        day = date(2026, 3, 2)
+        ann = self.technician(self.company, 'ann', '9000000102', [self.plumbing])
+        sam = self.technician(self.company, 'sam', '9000000103', [self.plumbing])
+        self.technician(self.company, 'wes', '9000000104', [self.wiring])
+        for offset in range(3):
+            self.service_request(technician=ann, status='accepted', preferred_date=date(2026, 3, 10 + offset))
+        self.service_request(technician=sam, status='assigned', preferred_date=day)
+
+        ranked = rank_technicians(self.service_request(preferred_date=day))
+        self.assertEqual([item['tech'] for item in ranked], [self.tom, ann, sam])  # wes lacks the skill
+        self.assertEqual([item['conflict'] for item in ranked], [False, False, True])
+        self.assertGreater(ranked[0]['score'], ranked[1]['score'])
+
+    def test_backlog_assigns_each_request_once_and_spreads_the_load(self):
+        ann = self.technician(self.company, 'ann', '9000000102', [self.plumbing])
+        requests = [self.service_request(preferred_date=date(2026, 3, 2)) for _ in range(3)]
+        self.service_request(service=self.wiring)  # nobody has the skill
+        raced = requests[2]
+        real_transition = dispatch.transition
+
+        def racing_transition(service_request, status, **fields):
+            if service_request.pk == raced.pk:  # someone else cancels it mid-dispatch
+                ServiceRequest.objects.filter(pk=raced.pk).update(status='cancelled')
+            return real_transition(service_request, status, **fields)
+
+        with mock.patch('service.dispatch.transition', racing_transition):
+            assigned = dispatch_backlog(self.company)
+        self.assertEqual([(sr.pk, tech) for sr, tech in assigned],
+                         [(requests[0].pk, self.tom), (requests[1].pk, ann)])
+        raced.refresh_from_db()
+        self.assertEqual((raced.status, raced.technician), ('cancelled', None))
+        self.assertEqual(dispatch_backlog(self.company), [])
+
+        out = io.StringIO()
+        call_command('dispatch_backlog', company=self.company.pk, stdout=out)
+        self.assertIn('Assigned 0 requests.', out.getvalue())
+
+    def test_other_companies_cannot_see_or_assign_a_request(self):
+        service_request = self.service_request()
+        url = reverse('assign_technician', args=[service_request.pk])
+        for user in (self.other.user, self.customer.user, self.tom.user):
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertEqual(self.client.post(url, {'auto': '1'}).status_code, 404)
+        self.client.force_login(self.company.user)
+        self.assertEqual(self.client.post(url, {'technician': self.outsider.pk}).status_code, 404)
+        service_request.refresh_from_db()
+        self.assertEqual((service_request.status, service_request.technician), ('requested', None))
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = CompanyProfile.objects.create(
+            user=User.objects.create_user('acme', 'acme@example.com', 'pw', role='company'),
+            company_name='Acme', phone='9000000001', address='x')
+        self.customer = CustomerProfile.objects.create(
+            user=User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer'),
+            cust_name='Bob', phone='9000000002', address='x')
+        self.service = ServiceType.objects.create(company=self.company, name='Plumbing', base_price=100)
+        self.technician = TechnicianProfile.objects.create(
+            user=User.objects.create_user('tom', 'tom@example.com', 'pw', role='technician'),
+            company=self.company, name='Tom', phone='9000000003')
+        self.requests = [ServiceRequest.objects.create(
+            customer=self.customer, company=self.company, service_type=self.service,
+            technician=self.technician, base_price=100, status='paid') for _ in range(2)]
+        self.client.force_login(self.customer.user)
+
+    def aggregates(self):
+        return [(obj.rating_count, obj.rating_sum, obj.avg_rating)
+                for obj in (ServiceType.objects.get(), CompanyProfile.objects.get(),
+                            TechnicianProfile.objects.get())]
+
+    def test_feedback_updates_aggregates_like_a_recompute(self):
+        for service_request, rating in zip(self.requests, (4, 2)):
+            self.client.post(reverse('feedback_view', args=[service_request.pk]),
+                             {'rating': rating, 'feedback': 'ok'})
+        self.assertEqual(self.aggregates(), [(2, 6, 3.0)] * 3)
+        self.client.post(reverse('feedback_view', args=[self.requests[1].pk]), {'rating': 5, 'feedback': 'better'})
+        self.assertEqual(self.aggregates(), [(2, 9, 4.5)] * 3)
+
+        ServiceType.objects.update(rating_count=0, rating_sum=0)
+        recompute_ratings()
+        self.assertEqual(self.aggregates(), [(2, 9, 4.5)] * 3)
+
+
+@skipUnless(search.supported(), "needs the SQLite or PostgreSQL full-text index")
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.acme = CompanyProfile.objects.create(
+            user=User.objects.create_user('acme', 'acme@example.com', 'pw', role='company'),
+            company_name='Acme', phone='9000000001', address='x')
+        cls.pipes = ServiceType.objects.create(
+            company=cls.acme, name='Drain cleaning', description='Blocked plumbing and pipes', base_price=100)
+        cls.plumbing = ServiceType.objects.create(
+            company=cls.acme, name='Plumbing', description='Taps and leaks', base_price=100)
+        cls.wiring = ServiceType.objects.create(
+            company=cls.acme, name='Wiring', description='Sockets', base_price=100)
+
+    def found(self, text, **kwargs):
+        return list(search_services(ServiceType.objects.all(), text, **kwargs))
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.found('plumbing'), [self.plumbing, self.pipes])
+
+    def test_every_term_matches_as_a_prefix(self):
+        self.assertEqual(self.found('plu'), [self.plumbing, self.pipes])
+        self.assertEqual(self.found('plu lea'), [self.plumbing])
+        self.assertEqual(self.found('lumbing'), [])
+
+    def test_results_are_capped(self):
+        services = ServiceType.objects.bulk_create([
+            ServiceType(company=self.acme, name=f'Roofing {i}', base_price=100)
+            for i in range(search.max_results() + 5)])
+        search.index_services(service.pk for service in services)
+        self.assertEqual(len(search.ranked_ids('roofing')), search.max_results())
+
+    def test_company_rename_reindexes_its_services(self):
+        self.assertEqual(self.found('zenith'), [])
+        self.acme.company_name = 'Zenith Home'
+        self.acme.save()
+        self.assertEqual({service.pk for service in self.found('zenith')},
+                         {self.pipes.pk, self.plumbing.pk, self.wiring.pk})
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        company = CompanyProfile.objects.create(
+            user=User.objects.create_user('acme', 'acme@example.com', 'pw', role='company'),
+            company_name='Acme', phone='9000000001', address='x')
+        customer = CustomerProfile.objects.create(
+            user=User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer'),
+            cust_name='Bob', phone='9000000002', address='x')
+        service = ServiceType.objects.create(company=company, name='Plumbing', base_price=100)
+        dates = [None, date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 3)]  # many ties, some NULL
+        ServiceRequest.objects.bulk_create([
+            ServiceRequest(customer=customer, company=company, service_type=service, base_price=100,
+                           preferred_date=dates[i % 4]) for i in range(23)])
+        def key(row):  # newest first, NULL dates last, ties by id
+            return row.preferred_date is None, -(row.preferred_date or date.min).toordinal(), row.pk
+        cls.expected = [row.pk for row in sorted(ServiceRequest.objects.all(), key=key)]
+
+    def paginator(self):
+        return CursorPaginator(ServiceRequest.objects.all(), 4, ('-preferred_date', 'id'))
+
+    def test_next_and_previous_round_trip(self):
+        paginator = self.paginator()
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([row.pk for page in pages for row in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [4, 4, 4, 4, 4, 3])
+        self.assertFalse(pages[0].has_previous)
+
+        back = [pages[-1]]
+        while back[-1].has_previous:
+            back.append(paginator.page(back[-1].previous_cursor))
+        self.assertEqual([[row.pk for row in page] for page in reversed(back)],
+                         [[row.pk for row in page] for page in pages])
+
+    def test_bad_cursors_give_the_first_page(self):
+        first = [row.pk for row in self.paginator().page()]
+        tampered = base64.urlsafe_b64encode(b'["n",["not-a-date","x"]]').decode()
+        for cursor in ('garbage', '!!!', tampered, base64.urlsafe_b64encode(b'["z",[null,1]]').decode(),
+                       base64.urlsafe_b64encode(b'{"n":1}').decode(), base64.urlsafe_b64encode(b'7').decode()):
+            with self.subTest(cursor):
+                page = self.paginator().get_page(RequestFactory().get('/', {'cursor': cursor}))
+                self.assertEqual([row.pk for row in page], first)
+
+
+class WorkloadTests(TestCase):
+    def test_workloads_take_one_query_for_any_number_of_technicians(self):
+        company = CompanyProfile.objects.create(
+            user=User.objects.create_user('acme', 'acme@example.com', 'pw', role='company'),
+            company_name='Acme', phone='9000000001', address='x')
+        customer = CustomerProfile.objects.create(
+            user=User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer'),
+            cust_name='Bob', phone='9000000002', address='x')
+        service = ServiceType.objects.create(company=company, name='Plumbing', base_price=100)
+        technicians = [TechnicianProfile.objects.create(
+            user=User.objects.create_user(f'tech{i}', f'tech{i}@example.com', 'pw', role='technician'),
+            company=company, name=f'Tech {i}', phone=f'900000010{i}') for i in range(6)]
+        statuses = ['assigned', 'accepted', 'Proceeding', 'completed', 'paid']
+        ServiceRequest.objects.bulk_create([
+            ServiceRequest(customer=customer, company=company, service_type=service, base_price=100,
+                           technician=technician, status=status, preferred_date=date(2026, 1, day + 1))
+            for day, technician in enumerate(technicians) for status in statuses[:day % 5 + 1]])
+
+        with self.assertNumQueries(1):
+            workloads = load_workloads(technicians, today=date(2026, 1, 1))
+            names = {duty.service_type.name for workload in workloads for duty in workload['duties']}
+        self.assertEqual(names, {'Plumbing'})
+        self.assertEqual([workload['active_count'] for workload in workloads], [1, 2, 3, 3, 3, 1])
+        self.assertEqual(workloads[2]['next_busy'], date(2026, 1, 3))
+
+
+class PushTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer')
+
+    async def test_in_process_broker_delivers_to_the_users_subscriptions(self):
+        broker = push.InProcessBroker()
+        async with broker.subscription(1) as subscription:
+            thread = threading.Thread(target=broker.publish, args=(1, {'id': 10}))  # e.g. a Celery thread
+            thread.start()
+            thread.join()
+            broker.publish(2, {'id': 20})
+            self.assertEqual(await subscription.get(timeout=1), {'id': 10})
+            self.assertIsNone(await subscription.get(timeout=0.01))
+        self.assertEqual(dict(broker._subscribers), {})
+
+    def test_wsgi_stream_tells_the_browser_to_poll(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('notification_stream')).status_code, 204)
+
+    @override_settings(NOTIFICATION_PUSH={'BACKEND': 'service.push.InProcessBroker'}, NOTIFICATION_STREAM_MAX_AGE=0)
+    async def test_asgi_stream_sends_events(self):
+        push.get_broker.cache_clear()
+        self.addCleanup(push.get_broker.cache_clear)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('notification_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertTrue(body.startswith(b'retry: '))
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.first, self.second = Notification.objects.bulk_create(
+            [Notification(user=self.user, message='first'), Notification(user=self.user, message='second')])
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(reverse('notifications'))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('notifications'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Notification.objects.create(user=self.user, message='third')
+        response = self.client.get(reverse('notifications'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_since_returns_only_newer_notifications(self):
+        data = self.client.get(reverse('notifications'), {'since': self.first.pk}).json()
+        self.assertEqual([n['id'] for n in data['notifications']], [self.second.pk])
+        self.assertEqual(data['unread_count'], 2)
+        self.assertEqual(data['cursor'], self.second.pk)
+
+    def test_bad_since_returns_everything(self):
+        data = self.client.get(reverse('notifications'), {'since': 'abc'}).json()
+        self.assertEqual({n['id'] for n in data['notifications']}, {self.first.pk, self.second.pk})
+
+
+@override_settings(NOTIFICATION_PUSH={'BACKEND': 'service.push.InProcessBroker'})
+class UnreadCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer')
+
+    def setUp(self):
+        cache.clear()
+        push.get_broker.cache_clear()
+        self.addCleanup(push.get_broker.cache_clear)
+
+    def test_count_follows_new_notifications(self):
+        self.assertEqual(feed.unread_count(self.user.pk), 0)
+        tasks.create_notifications([[self.user.pk, 'one'], [self.user.pk, 'two']])
+        with self.assertNumQueries(0):
+            self.assertEqual(feed.unread_count(self.user.pk), 2)
+
+    def test_increment_before_first_read_is_ignored(self):
+        Notification.objects.create(user=self.user, message='one')
+        feed.incr_unread(self.user.pk)
+        self.assertEqual(feed.unread_count(self.user.pk), 1)
+
+    def test_mark_read_resets_count(self):
+        tasks.create_notifications([[self.user.pk, 'one']])
+        self.assertEqual(feed.unread_count(self.user.pk), 1)
+        self.client.force_login(self.user)
+        self.client.post(reverse('mark_notifications_read'))
+        with self.assertNumQueries(0):
+            self.assertEqual(feed.unread_count(self.user.pk), 0)
+
+    def test_reconcile_fixes_drift(self):
+        other = User.objects.create_user('amy', 'amy@example.com', 'pw', role='customer')
+        since = timezone.now() - timedelta(minutes=1)
+        Notification.objects.bulk_create([Notification(user=self.user, message='one'),
+                                          Notification(user=other, message='two', is_read=True)])
+        cache.set(f'notifications:unread:{other.pk}', 5)  # drifted
+
+        self.assertEqual(feed.reconcile_unread(since, batch_size=1), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(feed.unread_count(self.user.pk), 1)
+            self.assertEqual(feed.unread_count(other.pk), 0)
+
+
+@override_settings(NOTIFICATION_PUSH={'BACKEND': 'service.push.InProcessBroker'})
+class NotificationBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'user{i}', f'user{i}@example.com', 'pw', role='customer')
+                     for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        push.get_broker.cache_clear()
+        self.addCleanup(push.get_broker.cache_clear)
+
+    def test_notify_records_one_outbox_row_per_recipient(self):
+        notify([user.pk for user in self.users], 'Hello')
+        notify_each([(self.users[0].pk, 'a'), (self.users[1].pk, 'b')])
+        self.assertEqual(list(Outbox.objects.values_list('task', 'payload').order_by('id')), [
+            (NOTIFY_TASK, [self.users[0].pk, 'Hello']), (NOTIFY_TASK, [self.users[1].pk, 'Hello']),
+            (NOTIFY_TASK, [self.users[2].pk, 'Hello']),
+            (NOTIFY_TASK, [self.users[0].pk, 'a']), (NOTIFY_TASK, [self.users[1].pk, 'b'])])
+
+    def test_relayed_batch_is_one_insert(self):
+        notify([user.pk for user in self.users], 'Hello')
+        with mock.patch.object(tasks.create_notifications, 'delay', side_effect=tasks.create_notifications):
+            outbox.relay()
+        self.assertEqual(Notification.objects.filter(message='Hello').count(), 3)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(tasks.create_notifications([[user.pk, 'Bye'] for user in self.users]), 3)
+
+
+class FlakyConnection:
+    """A mail connection that fails to send to ``bad`` recipients, and to reopen after ``opens`` opens."""
+
+    def __init__(self, bad=(), opens=None):
+        self.bad, self.opens, self.sent, self.opened = set(bad), opens, [], 0
+
+    def open(self):
+        if self.opens is not None and self.opened >= self.opens:
+            raise OSError("connection refused")
+        self.opened += 1
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & self.bad:
+                raise OSError("mailbox unavailable")
+            self.sent.extend(message.to)
+        return len(messages)
+
+
+class MailerTests(TestCase):
+    messages = [['Hi', 'Body', 'a@example.com'], ['Hi', 'Body', 'b@example.com'], ['Hi', 'Body', 'c@example.com']]
+
+    def test_failed_message_does_not_stop_the_batch(self):
+        connection = FlakyConnection(bad={'b@example.com'})
+        with self.assertLogs('service.mailer', 'WARNING'):
+            self.assertEqual(mailer.deliver(self.messages, connection), [self.messages[1]])
+        self.assertEqual(connection.sent, ['a@example.com', 'c@example.com'])
+        self.assertEqual(connection.opened, 2)
+
+    def test_rest_of_batch_fails_when_the_connection_cannot_reopen(self):
+        connection = FlakyConnection(bad={'a@example.com'}, opens=1)
+        with self.assertLogs('service.mailer', 'WARNING'):
+            self.assertEqual(mailer.deliver(self.messages, connection), self.messages)
+
+    def test_whole_batch_fails_when_the_connection_cannot_open(self):
+        with self.assertLogs('service.mailer', 'WARNING'):
+            self.assertEqual(mailer.deliver(self.messages, FlakyConnection(opens=0)), self.messages)
+
+    @override_settings(EMAIL_BATCH={'MAX_RETRIES': 2, 'RETRY_BACKOFF': 10})
+    def test_failures_are_retried_with_backoff(self):
+        failed = [self.messages[1]]
+        with mock.patch('service.mailer.deliver', return_value=failed), \
+                mock.patch.object(tasks.send_bulk_email, 'apply_async') as apply_async:
+            self.assertEqual(tasks.send_bulk_email(self.messages), {'sent': 2, 'failed': 1})
+            apply_async.assert_called_once_with((failed,), {'attempt': 1}, countdown=10)
+
+            apply_async.reset_mock()
+            tasks.send_bulk_email(failed, attempt=1)
+            apply_async.assert_called_once_with((failed,), {'attempt': 2}, countdown=20)
+
+            apply_async.reset_mock()
+            tasks.send_bulk_email(failed, attempt=2)
+            apply_async.assert_not_called()
+
+
+class OutboxTests(TestCase):
+    def test_rolled_back_change_records_nothing(self):
+        try:
+            with transaction.atomic():
+                notify([1], 'Hello')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(Outbox.objects.exists())
+
+    @override_settings(OUTBOX={'CHUNK_SIZES': {NOTIFY_TASK: 2}})
+    def test_relay_publishes_chunks_and_deletes_the_rows(self):
+        notify(range(5), 'Hello')
+        mailer.queue_email('Hi', 'Body', 'a@example.com')
+        with mock.patch.object(tasks.create_notifications, 'delay') as notifications, \
+                mock.patch.object(tasks.send_bulk_email, 'delay') as emails:
+            self.assertEqual(outbox.relay(), 6)
+        self.assertEqual([call.args[0] for call in notifications.call_args_list], [
+            [[0, 'Hello'], [1, 'Hello']], [[2, 'Hello'], [3, 'Hello']], [[4, 'Hello']]])
+        emails.assert_called_once_with([['Hi', 'Body', 'a@example.com']])
+        self.assertFalse(Outbox.objects.exists())
+        self.assertEqual(outbox.relay(), 0)
+
+    def test_relay_keeps_the_rows_when_publishing_fails(self):
+        notify([1, 2], 'Hello')
+        with mock.patch.object(tasks.create_notifications, 'delay', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                outbox.relay()
+        self.assertEqual(Outbox.objects.count(), 2)
+
+    def test_relay_claims_rows_with_skip_locked(self):
+        # SQLite has no row locks; see OutboxConcurrencyTests for the real thing.
+        notify([1], 'Hello')
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True,
+                               side_effect=QuerySet.select_for_update) as select_for_update, \
+                mock.patch.object(tasks.create_notifications, 'delay'):
+            outbox.relay()
+        self.assertEqual(select_for_update.call_args.kwargs, {'skip_locked': True})
+
+
+@skipUnless(connection.features.has_select_for_update_skip_locked, "needs SELECT ... FOR UPDATE SKIP LOCKED")
+class OutboxConcurrencyTests(TransactionTestCase):
+    def test_relay_skips_rows_locked_by_another_relay(self):
+        notify([1, 2], 'Hello')
+        locked, release = threading.Event(), threading.Event()
+
+        def other_relay():
+            with transaction.atomic():
+                list(Outbox.objects.select_for_update().order_by('id')[:1])
+                locked.set()
+                release.wait(5)
+            connection.close()
+
+        thread = threading.Thread(target=other_relay)
+        thread.start()
+        locked.wait(5)
+        try:
+            with mock.patch.object(tasks.create_notifications, 'delay') as delay:
+                self.assertEqual(outbox.relay(), 1)
+        finally:
+            release.set()
+            thread.join()
+        delay.assert_called_once_with([[2, 'Hello']])
+        self.assertEqual(Outbox.objects.count(), 1)
+
+
+class RequestProfilerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(REQUEST_PROFILER={'ENABLED': True, 'MODE': 'cprofile', 'RATE': 1.0})
+    def test_cprofile_stores_stats(self):
+        response = self.client.get(reverse('home'))
+        record = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((record.view_name, record.method, record.status_code, record.mode),
+                         ('home', 'GET', 200, 'cprofile'))
+        self.assertTrue(record.stats)
+        self.assertIn('function calls', profiling.summary(record))
+
+    @override_settings(REQUEST_PROFILER={'ENABLED': True, 'MODE': 'sampling', 'RATE': 1.0, 'INTERVAL': 0.001})
+    def test_sampling_stores_collapsed_stacks(self):
+        def slow_view(request):
+            time.sleep(0.05)
+            return HttpResponse()
+
+        response = profiling.RequestProfilerMiddleware(slow_view)(RequestFactory().get('/slow/'))
+        record = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((record.path, record.mode, record.stats), ('/slow/', 'sampling', None))
+        self.assertIn('slow_view', record.stacks)
+        self.assertRegex(record.stacks.splitlines()[0], r' \d+$')
+
+    @override_settings(REQUEST_PROFILER={'ENABLED': True, 'RATE': 0.0})
+    def test_only_staff_can_ask_for_a_profile(self):
+        user = User.objects.create_user('bob', 'bob@example.com', 'pw', role='customer')
+        self.client.force_login(user)
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('home'), {'profile': 1}))
+        User.objects.filter(pk=user.pk).update(is_staff=True)
+        self.assertIn('X-Profile-Id', self.client.get(reverse('home'), {'profile': 1}))
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('home')))
+
+    @override_settings(REQUEST_PROFILER={'ENABLED': True, 'RATE': 1.0, 'KEEP': 3})
+    def test_keeps_the_newest_profiles(self):
+        RequestProfile.objects.bulk_create([  # with gaps, as after failed inserts or other workers
+            RequestProfile(pk=pk, path='/', method='GET', status_code=200, mode='sampling',
+                           duration=0, sql_time=0, sql_count=0, template_time=0)
+            for pk in (3, 7, 49, 51, 120)])
+        with mock.patch('service.profiling.random.random', return_value=0.5):  # profiled, not pruned
+            self.client.get(reverse('home'))
+        self.assertEqual(RequestProfile.objects.count(), 6)
+
+        with mock.patch('service.profiling.random.random', return_value=0.0):
+            newest = int(self.client.get(reverse('home'))['X-Profile-Id'])
+        self.assertEqual(sorted(RequestProfile.objects.values_list('pk', flat=True)),
+                         [120, newest - 1, newest])
+
+    @override_settings(REQUEST_PROFILER={'ENABLED': False})
+    def test_disabled_profiler_leaves_the_stack(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            profiling.RequestProfilerMiddleware(HttpResponse)
@@ -21,18 +21,23 @@ urlpatterns = [
 
     path('add_company/',views.company_form,name='add_company'),
     path('company_dashboard/',views.company_dashboard,name='company_dashboard'),
+    path('company_dashboard/export/', views.export_requests, name='export_requests'),
     path('service_view/', views.service_view, name='service_view'),
     path('add_service/', views.add_service, name='add_service'),
     path('edit_service/<int:pk>/', views.edit_service, name='edit_service'),
     path('delete_service/<int:pk>/', views.delete_service, name='delete_service'),
     path('technician_list/',views.technician_list,name='technician_list'),
     path('add_technician/',views.technician_add,name='add_technician'),
+    path('bulk_import/', views.bulk_import, name='bulk_import'),
     path('technician_edit/<int:tech_id>/', views.technician_edit, name='technician_edit'),
     path('technician_delete/<int:tech_id>/', views.technician_delete, name='technician_delete'),
     path("assign_technician/<int:request_id>/", views.assign_technician, name="assign_technician"),
+    path("dispatch_requests/", views.dispatch_requests, name="dispatch_requests"),
     path("mark_payment_pending/<int:pk>/", views.mark_payment_pending, name="mark_payment_pending"),
     path('notifications/', views.notifications, name='notifications'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
     path('notifications/mark-read/', views.mark_notifications_read, name='mark_notifications_read'),
+    path('metrics', views.prometheus_metrics, name='metrics'),
 
 
     path('technician_dashboard/',views.technician_dashboard,name='technician_dashboard'),
@@ -4,28 +4,34 @@ from django.contrib.auth import login,authenticate,logout
 from .forms import (CompanyRegistrationForm,CustomerRegistrationForm,
                     CustomerProfileForm,CompanyProfileForm,ServiceTypeForm,
                     ServiceRequestForm,TechnicianForm,TechnicianSelfEditForm)
-from . models import CompanyProfile,ServiceRequest,TechnicianProfile,CustomerProfile, ServiceType,Notification
+from . models import CompanyProfile,ServiceRequest,TechnicianProfile,CustomerProfile, ServiceType,Notification,Invoice
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .tasks import send_custom_email,create_notification
-from django.core.paginator import Paginator
+from .mailer import queue_email
+from .onboarding import ImportFailed, generate_password, generate_username, import_services, queue_technicians, welcome_email
+from .notify import notify, notify_each
+from .rollups import company_status_counts
+from .ratings import apply_rating
+from .search import search_services
+from . import exports, feed, fragments, invoices, metrics, push
+from .dispatch import assign, auto_assign, dispatch_backlog, rank_technicians
+from .lifecycle import transition, transition_many
+from .pagination import CursorPaginator
+from .pagecache import anonymous_page
+from datetime import date
 from decimal import Decimal
-import random
-import string
-from django.http import JsonResponse
+import asyncio
+import json
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
 from django.views.decorators.http import require_POST
-from django.db.models import Avg, Q, F, Count
+from django.db import transaction
+from django.db.models import Q, F
 
 User = get_user_model()
-def generate_username(email, company_name):
-    email_prefix = email.split('@')[0]
-    random_number = random.randint(100, 999)
-    return f"{company_name[:3].lower()}_{email_prefix}_{random_number}"
-
-def generate_password(length=8):
-    characters = string.ascii_letters + string.digits
-    return ''.join(random.choice(characters) for _ in range(length))
-
+@anonymous_page(tags=('catalog',), params=())
 def home(request):
     return render(request,'home.html')
 
@@ -121,22 +127,10 @@ def company_dashboard(request):
     company = request.user.company_profile    
     all_requests = ServiceRequest.objects.filter(company=company).select_related(
         'customer', 'technician', 'service_type'
-    ).order_by('-preferred_date')
-
-    counts = {
-        'requested': all_requests.filter(status='requested').count(),
-        'assigned': all_requests.filter(status='assigned').count(),
-        'accepted': all_requests.filter(status='accepted').count(),
-        'rejected': all_requests.filter(status='rejected').count(),
-        'Proceeding': all_requests.filter(status='Proceeding').count(),
-        'payment_pending': all_requests.filter(status='payment_pending').count(),
-        'paid': all_requests.filter(status='paid').count(),
-        'completed': all_requests.filter(status='completed').count(),
-        'cancelled': all_requests.filter(status='cancelled').count(),
-        'total': all_requests.count(),
-    }
-    
-    
+    )
+
+    counts = company_status_counts(company)
+
     status_cards = [
         ('requested', 'Requested', 'bi-hourglass-split', 'primary'),
         ('assigned', 'Assigned', 'bi-person-check-fill', 'info'),
@@ -156,9 +150,9 @@ def company_dashboard(request):
     if selected_status:
         filtered_requests = all_requests.filter(status=selected_status)
 
-    paginator = Paginator(filtered_requests, 10)
-    page_number = request.GET.get('page')
-    service_requests = paginator.get_page(page_number)
+    paginator = CursorPaginator(filtered_requests, 10, ('-preferred_date', 'id'))
+    service_requests = paginator.get_page(request)
+    fragments.stamp(service_requests, 'requests')
     
     context = {
         'requests': service_requests,
@@ -171,6 +165,25 @@ def company_dashboard(request):
     return render(request, 'company_dashboard.html', context)
 
 
+@login_required
+def export_requests(request):
+    company = get_object_or_404(CompanyProfile, user=request.user)
+    fmt = request.GET.get('format', 'csv')
+    try:
+        if fmt not in exports.FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}")
+        filters = exports.parse_filters(
+            request.GET.get('status'), request.GET.get('from'), request.GET.get('to'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    queryset = exports.company_requests(company, **filters)
+    response = StreamingHttpResponse(exports.stream(queryset, fmt), content_type=exports.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="service-requests-{date.today()}.{fmt}"'
+    response['Cache-Control'] = 'private, no-store'
+    response['X-Accel-Buffering'] = 'no'  # let nginx pass rows on as they are written
+    return response
+
+
 @login_required
 def technician_list(request):
     company = get_object_or_404(CompanyProfile,user=request.user)
@@ -184,9 +197,9 @@ def technician_list(request):
     else:
         technician_list  = TechnicianProfile.objects.filter(
             company=company)
-    paginator = Paginator(technician_list, 10)
-    page_number = request.GET.get('page')
-    technicians = paginator.get_page(page_number)
+    technician_list = technician_list.select_related('user').prefetch_related('service_types')
+    paginator = CursorPaginator(technician_list, 10, ('-id',))
+    technicians = paginator.get_page(request)
     
     return render(request,'technician_list.html',context={
         'page_obj':technicians,'service_types':service_types,
@@ -213,50 +226,22 @@ def technician_add(request):
             username = generate_username(email, company.company_name)
             password = generate_password()
 
-            user = User.objects.create_user(
-                username=username,
-                email=email,
-                password=password,
-                role='technician'
-            )
-
-            technician = form.save(commit=False)
-            technician.user = user
-            technician.name = name
-            technician.company = company
-            technician.save()
-            technician.service_types.set(service_types)
-            try:
-                send_custom_email.delay(
-                    subject=f"Welcome to {company.company_name}!",
-                    message=f"""
-                    Dear {technician.name},
-
-                    Welcome to **{company.company_name}**!
-
-                    Your technician account has been successfully created and activated.
-                    You can now log in to your dashboard and begin managing your assigned service requests.
-
-                     **Login Credentials**
-                    • **Username:** {technician.user.username}
-                    • **Password:** {password}
-
-                    Please keep your credentials confidential and do not share them with anyone.
-
-                    If you have any questions or need assistance, feel free to reach out to your company admin or our support team.
-
-                    Thank you for joining our team!
-                    We look forward to working with you.
-
-                    Warm regards,
-                    {company.company_name}
-                    Support Team
-                    """,
-                        email=technician.user.email
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    username=username,
+                    email=email,
+                    password=password,
+                    role='technician'
                 )
-                messages.success(request, "Technician added and credentials sent by email.")
-            except Exception as e:
-                messages.warning(request, f"Technician added but email could not be sent")
+
+                technician = form.save(commit=False)
+                technician.user = user
+                technician.name = name
+                technician.company = company
+                technician.save()
+                technician.service_types.set(service_types)
+                queue_email(*welcome_email(company, technician.name, user.username, password, user.email))
+            messages.success(request, "Technician added and credentials sent by email.")
             return redirect('technician_list')
 
     else:
@@ -267,6 +252,32 @@ def technician_add(request):
 
 
 
+@login_required
+def bulk_import(request):
+    company = get_object_or_404(CompanyProfile, user=request.user)
+    kind = request.POST.get('kind', request.GET.get('kind', 'technicians'))
+    errors = []
+    if request.method == 'POST' and kind in ('technicians', 'services') and request.FILES.get('file'):
+        try:
+            content = request.FILES['file'].read().decode('utf-8')
+            if kind == 'technicians':
+                # Password hashing takes far too long for a request; a worker does it.
+                count = queue_technicians(company, content)
+            else:
+                count = len(import_services(company, content))
+        except UnicodeDecodeError:
+            errors = [(None, "The file must be a UTF-8 encoded CSV.")]
+        except ImportFailed as e:
+            errors = e.errors
+        else:
+            if kind == 'technicians':
+                messages.success(request, f"Importing {count} technicians. You will get a notification when they are ready.")
+                return redirect('technician_list')
+            messages.success(request, f"Imported {count} services.")
+            return redirect('service_view')
+    return render(request, 'bulk_import.html', {'kind': kind, 'errors': errors})
+
+
 @login_required
 def technician_edit(request, tech_id):
     technician = get_object_or_404(TechnicianProfile, id=tech_id)
@@ -288,99 +299,94 @@ def technician_delete(request, tech_id):
             technician=technician,
             status__in=['assigned', 'accepted', 'Proceeding']
         )
-        print("active", active_requests)
-        for req in active_requests:
-            req.technician = None  
-            req.status = 'requested'  
-            req.save()
         user = technician.user
-        technician.delete()
-        user.delete()
+        with transaction.atomic():
+            transition_many(active_requests, 'requested', technician=None)
+            technician.delete()
+            user.delete()
         messages.success(request, "Technician deleted successfully.")
     return redirect('technician_list')
 
 
 @login_required
 def assign_technician(request, request_id):
-    service_request = get_object_or_404(ServiceRequest, id=request_id)
-    company = request.user.company_profile
-    service_type = service_request.service_type
-    technicians = TechnicianProfile.objects.filter(
-        company=company,service_types=service_type)
-    print("te", technicians)
-    tech_data = []
-    for tech in technicians:
-        duties = ServiceRequest.objects.filter(
-            technician=tech,
-            status__in=['assigned', 'accepted', 'Proceeding', 'completed']
-        ).order_by('preferred_date')
-        tech_data.append({
-            'tech': tech,
-            'duties': duties
-        })
+    try:
+        company = request.user.company_profile  # cached for company_base.html
+    except CompanyProfile.DoesNotExist:
+        raise Http404
+    service_request = get_object_or_404(ServiceRequest, id=request_id, company=company)
 
     if request.method == 'POST':
-        tech_id = request.POST.get('technician')
-        technician = get_object_or_404(TechnicianProfile, id=tech_id)
-        service_request.technician = technician
-        service_request.status = 'assigned'
-        service_request.save()
-        message = f"New {service_request.service_type.name} service request assigned to you for {service_request.customer.cust_name}."
-        create_notification.delay(technician.user.id, message)
-        send_custom_email.delay(
-            subject="Technician Assigned",
-            message=f"""
-                Hello {service_request.customer.cust_name},
-
-                Your service request '{service_request.service_type.name}' 
-                has been assigned to technician {technician.name}.
-
-                Company: {company.company_name}
-                """,
-                email=service_request.customer.user.email
-            )
+        if request.POST.get('auto'):
+            technician = auto_assign(service_request)
+            if technician is None:
+                messages.error(request, "No technician could be auto-assigned to this request.")
+                return redirect('assign_technician', request_id=service_request.id)
+        else:
+            tech_id = request.POST.get('technician')
+            technician = get_object_or_404(TechnicianProfile, id=tech_id, company=company)
+            if not assign(service_request, technician):
+                messages.error(request, "This request can no longer be assigned.")
+                return redirect('company_dashboard')
         messages.success(request, f"{technician.name} has been assigned to this request.")
         return redirect('company_dashboard')
 
     return render(request, 'assign_technician.html', {
         'service_request': service_request,
-        'tech_data': tech_data
+        'tech_data': rank_technicians(service_request)
     })
 
 
+@login_required
+@require_POST
+def dispatch_requests(request):
+    company = request.user.company_profile
+    assigned = dispatch_backlog(company)
+    if assigned:
+        messages.success(request, f"Auto-assigned {len(assigned)} pending requests.")
+    else:
+        messages.info(request, "No pending requests could be auto-assigned.")
+    return redirect('company_dashboard')
+
+
 @login_required
 def mark_payment_pending(request, pk):
     req = get_object_or_404(ServiceRequest, pk=pk)
     cust_user = req.customer.user.id
     if request.method == 'POST' and req.status == 'completed':
-        req.status = 'payment_pending'
-        req.save()
         message = f"Please complete payment for {req.title}"
-        create_notification.delay(cust_user, message)
-        messages.success(request, f"Requested {req.customer.cust_name} for makimg payment.")
+        with transaction.atomic():
+            won = transition(req, 'payment_pending')
+            if won:
+                notify([cust_user], message)
+        if won:
+            messages.success(request, f"Requested {req.customer.cust_name} for makimg payment.")
+        else:
+            messages.error(request, "This request has already been updated.")
     return redirect('company_dashboard')
 
 def customer_register(request):
     if request.method == 'POST':
         form = CustomerRegistrationForm(request.POST)
         if form.is_valid():
-            user =  form.save(commit=False)
-            user.role = 'customer'
-            user.save()
-            CustomerProfile.objects.create(
-                    user=user,
-                    cust_name=form.cleaned_data['cust_name'],
-                    phone=form.cleaned_data['phone'],
-                    address=form.cleaned_data['address'],
-                )
-            send_custom_email.delay(
-                subject="Welcome to ServiceConnect!",
-                message=f"""
+            with transaction.atomic():
+                user =  form.save(commit=False)
+                user.role = 'customer'
+                user.save()
+                CustomerProfile.objects.create(
+                        user=user,
+                        cust_name=form.cleaned_data['cust_name'],
+                        phone=form.cleaned_data['phone'],
+                        address=form.cleaned_data['address'],
+                    )
+                queue_email(
+                    subject="Welcome to ServiceConnect!",
+                    message=f"""
                 Hello {form.cleaned_data['cust_name']},
                 Your account has been created successfully.
                 Thank you for joining ServiceConnect!""",
-                email=form.cleaned_data['email']
-            )
+                    email=form.cleaned_data['email']
+                )
             messages.success(request, "Account created successfully! Please log in.")
             return redirect('login')
     else:
@@ -390,23 +396,24 @@ def customer_register(request):
     return render(request,'registration_form.html',
         context={'form':form,'title':'customer'})
 
+@anonymous_page(tags=('catalog',), params=('search', 'company', 'cursor'))
 def customer_dashboard(request):
     search = request.GET.get('search', '')
     company_id = request.GET.get('company', '')
 
     # services = ServiceType.objects.all()
-    services = ServiceType.objects.annotate(
-        avg_rating=Avg('service_requests__rating'),
-        rating_count=Count('service_requests__rating')  
-    ).order_by('-id')  
-    if search:
-        services = services.filter(name__icontains=search)
+    services = ServiceType.objects.select_related('company').order_by('-id')
     if company_id:
         services = services.filter(company__id=company_id)
-    
-    paginator = Paginator(services, 8) 
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    ordering = ('-id',)
+    if search:
+        services = search_services(services, search, company_id=company_id)
+        if 'search_rank' in services.query.annotations:
+            ordering = ('search_rank', 'id')
+
+    paginator = CursorPaginator(services, 8, ordering)
+    page_obj = paginator.get_page(request)
+    fragments.stamp(page_obj, 'catalog')
     companies = CompanyProfile.objects.all()
     context ={ 
         "page_obj": page_obj,
@@ -422,10 +429,8 @@ def customer_dashboard(request):
 def service_view(request):
     company = get_object_or_404(CompanyProfile, user=request.user)
     services_list = ServiceType.objects.filter(company=company)
-    paginator = Paginator(services_list, 8) 
-
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(services_list, 8, ('-id',))
+    page_obj = paginator.get_page(request)
 
     return render(request,'service_view.html',
         context={'page_obj':page_obj})
@@ -491,12 +496,13 @@ def request_service(request, service_id):
             service_request.service_type = service
             service_request.title = f"{service.name} - {company.company_name}"
             service_request.base_price = service.base_price
-            service_request.save()
             message = f"New service request from {request.user.customer_profile.cust_name} for {service_request.service_type.name}."
-            create_notification.delay(company.user.id, message)
-            send_custom_email.delay(
-                subject="New Service Request Received",
-                message=f"""
+            with transaction.atomic():
+                service_request.save()
+                notify([company.user.id], message)
+                queue_email(
+                    subject="New Service Request Received",
+                    message=f"""
                 Hello {company.company_name},
 
                 A new service request has been submitted.
@@ -504,8 +510,8 @@ def request_service(request, service_id):
                 Customer: {customer_profile.cust_name}
                 Service Requested: {service_request.service_type.name}
                 Preferred Date: {service_request.preferred_date}""",
-                    email=company.user.email
-            )
+                        email=company.user.email
+                )
             messages.success(request, "Service request submitted successfully!")
             return redirect('customer_dashboard')
         else:
@@ -520,15 +526,15 @@ def request_service(request, service_id):
 @login_required
 def cust_view_requests(request):
     customer = get_object_or_404(CustomerProfile, user=request.user)
-    request_list = ServiceRequest.objects.filter(customer=customer).order_by('-created_at')
+    request_list = ServiceRequest.objects.filter(customer=customer).select_related(
+        'company', 'service_type', 'technician')
 
     status = request.GET.get('status')
     if status:
         request_list = request_list.filter(status=status)
 
-    paginator = Paginator(request_list, 10)
-    page_number = request.GET.get('page')
-    requests = paginator.get_page(page_number)
+    paginator = CursorPaginator(request_list, 10, ('-created_at', 'id'))
+    requests = paginator.get_page(request)
 
     return render(request, 'customer_requests.html', {'requests': requests})
 
@@ -536,7 +542,15 @@ def cust_view_requests(request):
 
 @login_required
 def invoice_view(request, request_id):
-    service_request = get_object_or_404(ServiceRequest, id=request_id)
+    service_request = get_object_or_404(
+        ServiceRequest.objects.select_related('customer__user', 'company', 'technician', 'service_type'),
+        id=request_id)
+    if request.user.pk not in (service_request.customer.user_id, service_request.company.user_id):
+        raise Http404
+    if service_request.status == 'paid':
+        invoice = Invoice.objects.filter(service_request=service_request).first()
+        if invoice is not None:
+            return invoices.serve(request, invoice, 'pdf' if request.GET.get('format') == 'pdf' else 'html')
 
     context = {
         'service_request': service_request,
@@ -551,15 +565,21 @@ def invoice_view(request, request_id):
 def payment_proceed(request, request_id):
     service_request = get_object_or_404(ServiceRequest, id=request_id)
 
-    if not service_request.actual_price:
-        service_request.actual_price = service_request.base_price + (service_request.extra_charges or 0)
+    actual_price = service_request.actual_price
+    if not actual_price:
+        actual_price = service_request.base_price + (service_request.extra_charges or 0)
 
-    service_request.status = 'paid'
-    service_request.save()
     company_user = service_request.company.user.id
-    message = f"{service_request.customer.cust_name} has paid {service_request.actual_price}"
-    create_notification.delay(company_user, message)
-    messages.success(request, "Payment successful! Thank you.")
+    message = f"{service_request.customer.cust_name} has paid {actual_price}"
+    with transaction.atomic():
+        won = transition(service_request, 'paid', actual_price=actual_price)
+        if won:
+            notify([company_user], message)
+    if won:
+        messages.success(request, "Payment successful! Thank you.")
+    elif service_request.status != 'paid':
+        messages.error(request, "This request is not awaiting payment.")
+        return redirect('my_requests')
     return redirect('feedback_view', request_id=service_request.id)
 
 @login_required
@@ -570,9 +590,12 @@ def feedback_view(request, request_id):
         rating = request.POST.get("rating")
         feedback_text = request.POST.get("feedback")
 
+        old_rating = service_request.rating
         service_request.rating = int(rating)
         service_request.feedback = feedback_text
-        service_request.save()
+        with transaction.atomic():
+            service_request.save()
+            apply_rating(service_request, old_rating, service_request.rating)
 
         messages.success(request, "Thank you for sharing your valuable feedback!")
         return redirect("customer_dashboard")
@@ -583,7 +606,8 @@ def feedback_view(request, request_id):
 @login_required
 def technician_dashboard(request):
     tech_profile = get_object_or_404(TechnicianProfile, user=request.user)
-    service_requests = ServiceRequest.objects.filter(technician=tech_profile)
+    service_requests = ServiceRequest.objects.filter(technician=tech_profile).select_related(
+        'customer', 'service_type')
     return render(request,'technician_dashboard.html',
         context={'tech':tech_profile, 'requests':service_requests})
 
@@ -593,16 +617,11 @@ def update_request_status(request, request_id, status):
     tech_profile = get_object_or_404(TechnicianProfile, user=request.user)
     service_request = get_object_or_404(ServiceRequest, id=request_id, technician=tech_profile)
     company_user = service_request.company.user.id
-    print("status",status)
     valid_statuses = ['accepted', 'rejected', 'Proceeding']
     if status not in valid_statuses:
         messages.error(request, "Invalid status update.")
         return redirect('technician_dashboard')
 
-    service_request.status = status
-
-    service_request.save()
-
     if status in ['accepted', 'Proceeding']:
         tech_profile.status = 'busy'
         if status == 'accepted':
@@ -612,8 +631,12 @@ def update_request_status(request, request_id, status):
     elif status == 'rejected':
         tech_profile.status = 'available'
         message = f"{tech_profile.name} has rejected {service_request.service_type.name} service for {service_request.customer.cust_name}"
-    tech_profile.save()
-    create_notification.delay(company_user, message)
+    with transaction.atomic():
+        if not transition(service_request, status):
+            messages.error(request, "This request has already been updated.")
+            return redirect('technician_dashboard')
+        tech_profile.save(update_fields=['status'])
+        notify([company_user], message)
     return redirect('technician_dashboard')
 
 
@@ -661,42 +684,61 @@ def complete_service(request, request_id):
         except:
             extra_charges = Decimal(0)
             
-        service_request.extra_charges = extra_charges
-        service_request.actual_price = service_request.base_price + extra_charges
-        
-        if extra_charges > 0:
-            service_request.status = 'completed'
-            message = f"{tech_profile.name} has completed {service_request.service_type.name} service for {service_request.customer.cust_name} with extra charges. Approval required."
-            create_notification.delay(company_user, message)
-            messages.success(request, "Service marked as completed. Waiting for company approval due to extra charges.")
-        else:
-            service_request.status = 'payment_pending'
-            cust_user_id = service_request.customer.user.id
-            cust_message = f"{service_request.title} service is completed. Please make the payment."
-            create_notification.delay(cust_user_id, cust_message)
-            comp_message = f"{tech_profile.name} has completed {service_request.service_type.name} service for {service_request.customer.cust_name}. Payment pending."
-            create_notification.delay(company_user, comp_message)
+        actual_price = service_request.base_price + extra_charges
+        status = 'completed' if extra_charges > 0 else 'payment_pending'
+
+        with transaction.atomic():
+            if not transition(service_request, status,
+                              extra_charges=extra_charges, actual_price=actual_price):
+                messages.error(request, "This request has already been updated.")
+                return redirect('technician_dashboard')
+            if extra_charges > 0:
+                message = f"{tech_profile.name} has completed {service_request.service_type.name} service for {service_request.customer.cust_name} with extra charges. Approval required."
+                notify([company_user], message)
+                messages.success(request, "Service marked as completed. Waiting for company approval due to extra charges.")
+            else:
+                cust_user_id = service_request.customer.user.id
+                cust_message = f"{service_request.title} service is completed. Please make the payment."
+                comp_message = f"{tech_profile.name} has completed {service_request.service_type.name} service for {service_request.customer.cust_name}. Payment pending."
+                notify_each([(cust_user_id, cust_message), (company_user, comp_message)])
             
-            messages.success(request, "Service completed. Customer has been notified for payment.")
+                messages.success(request, "Service completed. Customer has been notified for payment.")
 
-        service_request.save()
-        tech_profile.status = 'available'
-        tech_profile.save()
+            tech_profile.status = 'available'
+            tech_profile.save(update_fields=['status'])
         
         return redirect('technician_dashboard')
 
     return redirect('technician_dashboard')
 
 @login_required
-def notifications(request):
-    notifications = Notification.objects.filter(
-        user=request.user, is_read=False).order_by('-created_at')
-    data = [
-        {"message": n.message, "created_at": n.created_at.strftime("%b %d, %H:%M"), "read": n.is_read}
-        for n in notifications
-    ]
-    unread_count = notifications.count()
-    return JsonResponse({"notifications": data,"unread_count":unread_count})
+async def notifications(request):
+    user = await request.auser()
+    since = feed.parse_since(request.GET.get('since'))
+    wait = 0
+    if since is not None and isinstance(request, ASGIRequest):
+        wait = min(feed.parse_since(request.GET.get('wait')) or 0,
+                   getattr(settings, 'NOTIFICATION_LONG_POLL_MAX', 25))
+
+    state = await sync_to_async(feed.feed_state)(user.pk)
+    if wait and (state['latest'] or 0) <= since:
+        # Long-poll: hold the request until something new is pushed.
+        async with push.get_broker().subscription(user.pk) as subscription:
+            state = await sync_to_async(feed.feed_state)(user.pk)
+            if (state['latest'] or 0) <= since and await subscription.get(timeout=wait):
+                state = await sync_to_async(feed.feed_state)(user.pk)
+
+    etag = feed.etag(state)
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        data = await sync_to_async(feed.unread_since)(user.pk, since)
+        unread_count = await sync_to_async(feed.unread_count)(user.pk)
+        response = JsonResponse({"notifications": data, "unread_count": unread_count,
+                                 "cursor": state['latest'] or 0})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @login_required
@@ -704,4 +746,42 @@ def notifications(request):
 def mark_notifications_read(request):
     Notification.objects.filter(
         user=request.user, is_read=False).update(is_read=True)
-    return JsonResponse({"status": "ok"})
\ No newline at end of file
+    feed.reset_unread(request.user.pk)
+    return JsonResponse({"status": "ok"})
+
+
+@login_required
+async def notification_stream(request):
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be pinned for the life of the stream; make
+        # the browser fall back to polling instead.
+        return HttpResponse(status=204)
+    user = await request.auser()
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+    max_age = getattr(settings, 'NOTIFICATION_STREAM_MAX_AGE', 300)
+
+    async def events():
+        yield f"retry: {heartbeat * 1000}\n\n"
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_age
+        async with push.get_broker().subscription(user.pk) as subscription:
+            while loop.time() < deadline:
+                payload = await subscription.get(timeout=heartbeat)
+                if payload is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: notification\ndata: {json.dumps(payload)}\n\n"
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def prometheus_metrics(request):
+    token = metrics.config()['TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    if not token and not settings.DEBUG and not request.user.is_staff:
+        raise Http404  # no token configured: don't expose view and task names to anyone
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
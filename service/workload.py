@@ -0,0 +1,47 @@
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .models import ServiceRequest
+
+# Duty statuses that still need the technician to show up.
+ACTIVE_STATUSES = ('assigned', 'accepted', 'Proceeding')
+
+
+def load_duties(technician_ids, statuses=ServiceRequest.DUTY_STATUSES):
+    """Duties of all ``technician_ids`` in one query, grouped by technician id."""
+    duties = defaultdict(list)
+    technician_ids = list(technician_ids)
+    if not technician_ids:
+        return duties
+    rows = ServiceRequest.objects.filter(
+        technician_id__in=technician_ids, status__in=statuses
+    ).select_related('service_type').order_by('preferred_date', 'id')
+    for row in rows:
+        duties[row.technician_id].append(row)
+    return duties
+
+
+def summarize(technician, duties, today):
+    active = [d for d in duties if d.status in ACTIVE_STATUSES]
+    busy_dates = {d.preferred_date for d in active if d.preferred_date}
+    upcoming = [day for day in busy_dates if day >= today]
+    return {
+        'tech': technician,
+        'duties': duties,
+        'active_count': len(active),
+        'busy_dates': busy_dates,
+        'next_busy': min(upcoming, default=None),
+    }
+
+
+def load_workloads(technicians, today=None):
+    """Workload summary per technician, in the order given.
+
+    Each entry has ``tech``, ``duties`` (with ``service_type`` preloaded),
+    ``active_count``, ``busy_dates`` and ``next_busy``.
+    """
+    technicians = list(technicians)
+    today = today or timezone.localdate()
+    duties = load_duties(tech.pk for tech in technicians)
+    return [summarize(tech, duties.get(tech.pk, []), today) for tech in technicians]
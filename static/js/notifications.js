@@ -0,0 +1,118 @@
+const notifBell = document.getElementById('notifBell');
+const notifCount = document.getElementById('notifCount');
+const notifList = document.getElementById('notifList');
+
+// Id of the newest notification seen; the server only sends newer ones.
+let cursor = null;
+let notifications = [];
+
+function renderNotifications() {
+    notifList.innerHTML = `
+    <li class="dropdown-header fw-bold bg-warning">Notifications</li>
+    <li><hr class="dropdown-divider"></li>
+`;
+
+    if (notifications.length === 0) {
+        notifList.innerHTML += '<li class="text-center text-muted">No new notifications</li>';
+    } else {
+        notifications.forEach(n => {
+            notifList.innerHTML += `
+            <li>
+                <a class="dropdown-item small text-dark" href="#">
+                    ${n.message}<br>
+                    <small class="text-muted">${n.created_at}</small>
+                </a>
+            </li>
+        `;
+        });
+    }
+}
+
+function loadNotifications(wait) {
+    const params = new URLSearchParams();
+    if (cursor !== null) {
+        params.set('since', cursor);
+    }
+    if (wait) {
+        params.set('wait', wait);
+    }
+    return fetch('/notifications/?' + params, { credentials: 'include' })
+        .then(response => response.status === 304 ? null : response.json())
+        .then(data => {
+            if (!data) {
+                return;
+            }
+            const known = new Set(notifications.map(n => n.id));
+            notifications = (data.notifications || []).filter(n => !known.has(n.id)).concat(notifications);
+            cursor = data.cursor;
+            notifCount.textContent = data.unread_count || 0;
+            renderNotifications();
+        })
+        .catch(err => console.error('Error loading notifications:', err));
+}
+
+notifBell.addEventListener('click', function () {
+
+    loadNotifications();
+
+    setTimeout(() => {
+        fetch('/notifications/mark-read/', {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': getCookie('csrftoken'),
+                'Content-Type': 'application/json'
+            },
+            credentials: 'include'
+        })
+            .then(() => {
+                notifCount.textContent = 0;
+                notifications = [];
+            })
+            .catch(err => console.error('Error marking read:', err));
+    }, 5000);
+});
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+let pollTimer = null;
+function startPolling(interval) {
+    clearInterval(pollTimer);
+    pollTimer = setInterval(() => loadNotifications(), interval);
+}
+
+function longPoll() {
+    const started = Date.now();
+    loadNotifications(25).finally(() => {
+        // Servers that cannot hold the request answer at once; back off then.
+        setTimeout(longPoll, Date.now() - started > 5000 ? 1000 : 10000);
+    });
+}
+
+// Prefer the server-push stream with a slow safety poll while it is open;
+// fall back to long-polling the incremental feed when the server refuses it.
+loadNotifications();
+if (window.EventSource) {
+    const stream = new EventSource('/notifications/stream/');
+    stream.addEventListener('notification', () => loadNotifications());
+    stream.onopen = () => startPolling(60000);
+    stream.onerror = () => {
+        if (stream.readyState === EventSource.CLOSED) {
+            clearInterval(pollTimer);
+            longPoll();
+        }
+    };
+} else {
+    longPoll();
+}